@@ -0,0 +1,225 @@
+"""
+Author: HPC2H2
+Date: 2025-08-24
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 模型、模拟器与结果输出的性能基准测试。
+             报告各测试项的墙钟时间、吞吐量与峰值内存，可保存为基准文件，
+             并在之后的运行中与基准对比。
+
+用法：
+    python benchmark.py --save benchmark_results/baseline.json
+    python benchmark.py --compare benchmark_results/baseline.json
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+
+import numpy as np
+
+
+def _model():
+    import model_with_punishment as model
+    return model
+
+
+def bench_single_scenario():
+    """单个场景的逐星级动态规划"""
+    from enhancement_engine import solve_enhancement
+    model = _model()
+    factors = model.load_punishment_factors()
+
+    def run():
+        solve_enhancement(model.p_list, model.clover_additions, model.Vclovers,
+                          1 + model.guild_additions[5] + model.VIP_additions[9], factors)
+    return run, 1, "场景"
+
+
+def bench_full_sweep():
+    """全部 98 个 VIP × 公会场景"""
+    from enhancement_engine import solve_enhancement_sweep, scenario_multipliers
+    model = _model()
+    factors = model.load_punishment_factors()
+    multipliers = scenario_multipliers(model.VIP_additions, model.guild_additions)
+
+    def run():
+        solve_enhancement_sweep(model.p_list, model.clover_additions, model.Vclovers,
+                                multipliers, factors)
+    return run, multipliers.size, "场景"
+
+
+def _simulator():
+    from punishment_simulation import PunishmentSimulator, BASE_CARD_VALUES, SUCCESS_RATES, DOWNGRADE_LEVELS
+    return PunishmentSimulator(BASE_CARD_VALUES, SUCCESS_RATES, DOWNGRADE_LEVELS)
+
+
+def bench_simulate(method, star, trials):
+    """单个星级的失败降级模拟"""
+    simulator = _simulator()
+    simulate = {
+        "loop": simulator.simulate_enhancement,
+        "vectorized": simulator.simulate_enhancement_vectorized
+    }[method]
+
+    def run():
+        simulate(star - 1, star, trials)
+    return run, trials, "次模拟"
+
+
+def bench_generate_combinations(max_total, counts):
+    """卡片组合枚举"""
+    from generate_combinations import generate_combinations, generate_combination_counts
+
+    def run():
+        if counts:
+            generate_combination_counts(dim=3, max_total=max_total)
+        else:
+            generate_combinations(dim=3, max_total=max_total)
+    n = len(generate_combination_counts(dim=3, max_total=max_total))
+    return run, n, "组合"
+
+
+# outputjson 下各模型输出的子目录，每个一项基准
+JSON_SUBTREES = ("model_with_addition", "model_with_punishment", "punishment_simulation")
+
+
+def bench_json_roundtrip(subtree=None):
+    """
+    outputjson 目录树的 JSON 写入与读取
+
+    Args:
+        subtree: outputjson 下的子目录，None 表示整个目录树（不含结果缓存）
+    """
+    root = "outputjson" if subtree is None else os.path.join("outputjson", subtree)
+    files = {}
+    for directory, dirnames, filenames in os.walk(root):
+        if "cache" in dirnames:
+            dirnames.remove("cache")
+        for filename in filenames:
+            if filename.endswith(".json"):
+                path = os.path.join(directory, filename)
+                with open(path, "r", encoding="utf-8") as f:
+                    files[os.path.relpath(path, root)] = json.load(f)
+    target = tempfile.mkdtemp(prefix="fvr_benchmark_")
+    for relative in files:
+        os.makedirs(os.path.join(target, os.path.dirname(relative)), exist_ok=True)
+
+    def run():
+        for relative, data in files.items():
+            with open(os.path.join(target, relative), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+        for relative in files:
+            with open(os.path.join(target, relative), "r", encoding="utf-8") as f:
+                json.load(f)
+    run.cleanup = lambda: shutil.rmtree(target, ignore_errors=True)
+    return run, len(files), "文件"
+
+
+BENCHMARKS = {
+    "dp/single_scenario": bench_single_scenario,
+    "dp/full_sweep": bench_full_sweep,
+    **{f"simulate/loop/star{star}/{trials}": (lambda s=star, n=trials: bench_simulate("loop", s, n))
+       for star in (7, 12, 16) for trials in (1000, 10000)},
+    **{f"simulate/vectorized/star{star}/{trials}": (lambda s=star, n=trials: bench_simulate("vectorized", s, n))
+       for star in (7, 12, 16) for trials in (10000, 1000000)},
+    **{f"combinations/{'counts' if counts else 'strings'}/max_total{max_total}":
+       (lambda m=max_total, c=counts: bench_generate_combinations(m, c))
+       for max_total in (3, 10, 30) for counts in (False, True)},
+    "io/json_roundtrip": bench_json_roundtrip,
+    **{f"io/json_roundtrip/{subtree}": (lambda s=subtree: bench_json_roundtrip(s)) for subtree in JSON_SUBTREES},
+}
+
+
+def run_benchmark(name, repeat=5):
+    """
+    运行单个基准测试
+
+    Returns:
+        {"wall_time": 中位墙钟时间(秒), "min_time": 最短时间, "throughput": 每秒处理量,
+         "unit": 处理量单位, "peak_memory": 峰值内存(字节)}
+    """
+    run, items, unit = BENCHMARKS[name]()
+    try:
+        run()  # 预热
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        # 单独测一次峰值内存，避免 tracemalloc 的开销影响计时
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        getattr(run, "cleanup", lambda: None)()
+
+    wall_time = statistics.median(times)
+    return {
+        "wall_time": wall_time,
+        "min_time": min(times),
+        "throughput": items / wall_time if wall_time > 0 else float("inf"),
+        "unit": unit,
+        "peak_memory": peak
+    }
+
+
+def compare(results, baseline):
+    """打印与基准的对比，比值 > 1 表示变慢"""
+    print(f"\n{'测试项':<40}{'基准(ms)':>12}{'本次(ms)':>12}{'比值':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["wall_time"]
+        after = result["wall_time"]
+        ratio = after / before if before > 0 else float("inf")
+        flag = "  变慢" if ratio > 1.1 else ("  变快" if ratio < 0.9 else "")
+        print(f"{name:<40}{before * 1e3:>12.3f}{after * 1e3:>12.3f}{ratio:>8.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型、模拟器与结果输出的性能基准测试")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的测试项")
+    parser.add_argument("--repeat", type=int, default=5, help="每个测试项的计时次数")
+    parser.add_argument("--save", help="将结果保存为基准文件")
+    parser.add_argument("--compare", help="与已保存的基准文件对比")
+    parser.add_argument("--list", action="store_true", help="列出所有测试项")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    np.random.seed(0)
+    results = {}
+    print(f"{'测试项':<40}{'时间(ms)':>12}{'吞吐量':>18}{'峰值内存(MB)':>14}")
+    for name in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        result = run_benchmark(name, args.repeat)
+        results[name] = result
+        print(f"{name:<40}{result['wall_time'] * 1e3:>12.3f}"
+              f"{result['throughput']:>12.4g} {result['unit']}/s"
+              f"{result['peak_memory'] / 2**20:>14.2f}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results},
+                      f, ensure_ascii=False, indent=4)
+        print(f"基准已保存到 {args.save}")
+
+
+if __name__ == "__main__":
+    main()
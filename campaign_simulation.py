@@ -0,0 +1,161 @@
+"""
+Author: HPC2H2
+Date: 2025-08-28
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 从 0 星卡开始完成 N 张目标星级卡片的完整强化过程模拟。
+             按模型给出的各星级最优策略，副卡本身也要从 0 星卡逐级强化得到，
+             副卡的强化同样可能失败降级。大量玩家同时向量化模拟，
+             统计完成目标所消耗的 0 星卡与各等级四叶草的分布。
+"""
+
+import argparse
+
+import numpy as np
+
+# 只关心消耗总量而不关心时间顺序时，整个强化过程可以按星级自上而下一次算完：
+# 把库存记为 needs[玩家, c]，即还需要多少次 c → c+1 的成功。
+# 每个需求独立地重复尝试直到成功，n 个需求的失败次数服从负二项分布 NB(n, p)；
+# 每次尝试消耗的副卡要从 0 星卡强化到所需星级，产生更低星级的需求，
+# 每次失败降级 d 星则产生 c-d .. c-1 各一次需求。所有新需求都在更低星级，
+# 因此从最高星级向下逐级抽样，与逐次模拟的分布完全相同。
+
+
+def _downgrade_levels_array(star_limit, downgrade_levels):
+    """主卡在各星级强化失败后降级的星数"""
+    return np.array([min(downgrade_levels.get(c, 0), c) for c in range(star_limit + 1)])
+
+
+def simulate_campaign(strategy, target_star, n_cards=1, n_players=10000, downgrade_levels=None, seed=None):
+    """
+    模拟 n_players 个玩家各自从 0 星卡开始强化出 n_cards 张 target_star 星卡片
+
+    每次 c → c+1 的尝试消耗策略中第 c+1 星的副卡（同星、低一星、低二星）与四叶草，
+    副卡由一张新的 0 星卡逐级强化得到；成功后主卡升到 c+1 星，
+    失败时主卡按 downgrade_levels 降级（不在表中的星级失败不降级）。
+
+    Args:
+        strategy: 单个场景的求解结果（solve_enhancement 或 scenario_result 的返回值），
+                  使用其中的 card_counts、clover_indices 与 probabilities
+        target_star: 目标星级
+        n_cards: 每个玩家需要的目标星级卡片数
+        n_players: 同时模拟的玩家数
+        downgrade_levels: 降级表 {主卡当前星级: 失败后降级数}，None 表示失败不降级
+        seed: 随机数种子
+
+    Returns:
+        字典：
+            zero_star_cards: 各玩家消耗的 0 星卡数 (n_players,)
+            clovers: 各玩家消耗的各等级四叶草数 (n_players, 四叶草等级数)，第 0 列为不使用四叶草的次数
+            attempts: 各玩家在各目标星级上的尝试次数 (n_players, star_limit + 1)
+            produced: 各玩家强化出的各星级卡片数（含副卡与降级后重新强化的主卡）(n_players, star_limit + 1)
+    """
+    rng = np.random.default_rng(seed)
+    card_counts = np.asarray(strategy["card_counts"], dtype=np.int64)
+    clover_indices = np.asarray(strategy["clover_indices"], dtype=np.int64)
+    probabilities = np.minimum(np.asarray(strategy["probabilities"], dtype=float), 1)
+    star_limit = len(card_counts) - 1
+    n_clovers = int(clover_indices.max()) + 1
+    downs = _downgrade_levels_array(star_limit, downgrade_levels or {})
+
+    zero_star_cards = np.full(n_players, n_cards, dtype=np.int64)
+    clovers = np.zeros((n_players, n_clovers), dtype=np.int64)
+    attempts = np.zeros((n_players, star_limit + 1), dtype=np.int64)
+    produced = np.zeros((n_players, star_limit + 1), dtype=np.int64)
+
+    needs = np.zeros((n_players, star_limit + 1), dtype=np.int64)
+    needs[:, :target_star] = n_cards
+    for c in range(target_star - 1, -1, -1):
+        t = c + 1
+        n = needs[:, c]
+        failures = np.zeros(n_players, dtype=np.int64)
+        if probabilities[t] < 1:
+            pending = n > 0
+            failures[pending] = rng.negative_binomial(n[pending], probabilities[t])
+        tries = n + failures
+        attempts[:, t] = tries
+        produced[:, t] = n
+        clovers[:, clover_indices[t]] += tries
+
+        # 失败降级后重新强化到 c 星
+        if downs[c]:
+            needs[:, c - downs[c]:c] += failures[:, None]
+        # 副卡：每张由一张新的 0 星卡强化到所需星级
+        for j, count in enumerate(card_counts[t]):
+            if count:
+                card_star = max(t - 1 - j, 0)
+                zero_star_cards += tries * count
+                needs[:, :card_star] += (tries * count)[:, None]
+
+    return {
+        "zero_star_cards": zero_star_cards,
+        "clovers": clovers,
+        "attempts": attempts,
+        "produced": produced
+    }
+
+
+def summarize_campaign(campaign, Vclovers=None, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    汇总模拟结果的分布
+
+    Args:
+        campaign: simulate_campaign 的返回值
+        Vclovers: 各四叶草等级的价值，给定时同时汇总以 0 星卡计的总价值
+        quantiles: 需要的分位数
+
+    Returns:
+        {"0星卡": {...}, "四叶草": {等级下标: 平均消耗}, "总价值": {...}}，
+        分布项包含 mean、std 与各分位数
+    """
+    def distribution(samples):
+        summary = {"mean": float(samples.mean()), "std": float(samples.std())}
+        for q, value in zip(quantiles, np.quantile(samples, quantiles)):
+            summary[f"q{q:g}"] = float(value)
+        return summary
+
+    summary = {
+        "0星卡": distribution(campaign["zero_star_cards"]),
+        "四叶草": {k: float(mean) for k, mean in enumerate(campaign["clovers"].mean(axis=0)) if mean > 0}
+    }
+    if Vclovers is not None:
+        Vclovers = np.asarray(Vclovers, dtype=float)[:campaign["clovers"].shape[1]]
+        summary["总价值"] = distribution(campaign["zero_star_cards"] + campaign["clovers"] @ Vclovers)
+    return summary
+
+
+def main():
+    import model_with_punishment as model
+    from enhancement_engine import solve_enhancement
+
+    parser = argparse.ArgumentParser(description="从 0 星卡开始完成 N 张目标星级卡片的完整强化过程模拟")
+    parser.add_argument("--vip", type=int, default=0, help="VIP等级")
+    parser.add_argument("--guild", type=int, default=0, help="公会等级")
+    parser.add_argument("--target-star", type=int, default=model.STAR_LIMIT, help="目标星级")
+    parser.add_argument("--cards", type=int, default=1, help="每个玩家需要的目标星级卡片数")
+    parser.add_argument("--players", type=int, default=10000, help="同时模拟的玩家数")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    parser.add_argument("--ignore-punishment", action="store_true",
+                        help="使用不考虑失败惩罚的策略（模拟中仍按降级表降级）")
+    args = parser.parse_args()
+
+    multiplier = 1 + model.VIP_additions[args.vip] + model.guild_additions[args.guild]
+    factors = None if args.ignore_punishment else model.load_punishment_factors()
+    strategy = solve_enhancement(model.p_list, model.clover_additions, model.Vclovers, multiplier,
+                                 factors, model.STAR_LIMIT)
+    campaign = simulate_campaign(strategy, args.target_star, args.cards, args.players,
+                                 model.downgrade_levels, args.seed)
+    summary = summarize_campaign(campaign, model.Vclovers)
+
+    print(f"VIP等级 {args.vip}，公会等级 {args.guild}：{args.players} 个玩家各完成 "
+          f"{args.cards} 张 {args.target_star} 星卡片")
+    for name in ("0星卡", "总价值"):
+        print(f"{name}：" + "，".join(f"{key} {value:.6g}" for key, value in summary[name].items()))
+    print("四叶草平均消耗：" + "，".join(
+        f"{model.clover_levels[k] or '无'} {mean:.4g}" for k, mean in summary["四叶草"].items()))
+    print(f"模型期望价值：{float(strategy['Vcard_mins'][args.target_star]) * args.cards:.6g}")
+
+
+if __name__ == "__main__":
+    main()
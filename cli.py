@@ -0,0 +1,174 @@
+"""
+Author: HPC2H2
+Date: 2025-09-01
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 统一命令行入口。
+             子命令 solve / sweep / simulate / query / export / cache 分别对应单场景求解、全场景扫描、
+             惩罚模拟、查询预计算结果、结果格式转换与结果缓存管理。各子命令只在执行时导入所需模块，
+             query 不加载 numpy，单次查询的启动时间接近解释器本身。
+
+用法：
+    python cli.py solve --model punishment --vip 9 --guild 5
+    python cli.py sweep --model punishment --workers 4 --output-format both
+    python cli.py simulate --method markov --no-plot
+    python cli.py query --vip 9 --guild 5 --star 12
+    python cli.py export outputjson/model_with_punishment outputjson/model_with_punishment.fvr
+    python cli.py cache --max-bytes 1e8
+"""
+
+import os
+import json
+import argparse
+
+
+def _model_tables(model):
+    """
+    取出各模型的成功率表、四叶草与加成参数
+
+    Returns:
+        (模型模块, solve_enhancement 的关键字参数)
+    """
+    if model == "without":
+        import model_without_addition as module
+        return module, {}
+    if model == "addition":
+        import model_with_addition as module
+        kwargs = {}
+    else:
+        import model_with_punishment as module
+        if model == "mdp":
+            kwargs = {"downgrade_levels": module.downgrade_levels}
+        else:
+            kwargs = {"punishment_factors": module.load_punishment_factors()}
+    kwargs.update(clover_additions=module.clover_additions, Vclovers=module.Vclovers)
+    return module, kwargs
+
+
+def command_solve(args, extra):
+    """求解单个 VIP × 公会场景并打印各星级最佳策略"""
+    from enhancement_engine import solve_enhancement, format_strategy, CLOVER_LEVELS
+
+    module, kwargs = _model_tables(args.model)
+    multiplier = 1
+    if args.model != "without":
+        # 与 scenario_multipliers 相同的加法顺序，结果与全场景扫描逐位一致
+        multiplier = 1 + module.guild_additions[args.guild] + module.VIP_additions[args.vip]
+    result = solve_enhancement(module.p_list, multiplier=multiplier, star_limit=module.STAR_LIMIT,
+                               max_total=args.max_total, search=args.search, **kwargs)
+    clover_levels = getattr(module, "clover_levels", CLOVER_LEVELS)
+
+    print("最佳策略：")
+    for i in range(1, module.STAR_LIMIT + 1):
+        print(module.p_list[0][i] + format_strategy(result, i, clover_levels))
+    print("单张卡片的价值：")
+    for i in range(1, module.STAR_LIMIT + 1):
+        print(f"星级 {i} 的卡片价值: {result['Vcard_mins'][i]:.2f}，成本: {result['cost_mins'][i]:.2f}")
+
+
+def command_sweep(args, extra):
+    """求解所有场景并输出结果，其余参数交给 model_with_punishment.py"""
+    if args.model == "addition":
+        if extra:
+            raise SystemExit(f"model_with_addition 不接受参数: {' '.join(extra)}")
+        import model_with_addition
+        model_with_addition.main()
+    else:
+        import model_with_punishment
+        model_with_punishment.main(extra + ["--solver", args.model])
+
+
+def command_simulate(args, extra):
+    """惩罚模拟，参数见 punishment_simulation.py"""
+    import punishment_simulation
+    punishment_simulation.main(extra)
+
+
+def command_query(args, extra):
+    """从 JSON 目录或 .fvr 文件中查询单个场景单个星级的最佳策略"""
+    from result_store import JSON_FILENAME, read_row
+
+    key = str(args.star)
+    try:
+        if os.path.isdir(args.source):
+            path = os.path.join(args.source, JSON_FILENAME.format(vip=args.vip, guild=args.guild))
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = {
+                "最佳策略": data["最佳策略"][key],
+                "价值": data["单张卡片的价值"][key]["价值"],
+                "成本": data["单张卡片的价值"][key]["成本"]
+            }
+        else:
+            row, record = read_row(args.source, args.vip, args.guild, args.star)
+            entry = {"最佳策略": f"{args.star - 1}→{args.star}" + record.format(),
+                     "价值": row["价值"], "成本": row["成本"]}
+    except (FileNotFoundError, KeyError):
+        raise SystemExit(f"{args.source} 中没有场景 VIP{args.vip} 公会{args.guild} 星级{args.star} 的结果")
+    print(json.dumps(entry, ensure_ascii=False, indent=4))
+
+
+def command_export(args, extra):
+    """将按场景保存的 JSON 目录转换为列式二进制结果文件"""
+    from result_store import convert_json_directory
+
+    convert_json_directory(args.json_dir, args.output)
+    print(f"结果已保存到 {args.output}")
+
+
+def command_cache(args, extra):
+    """查看与清理结果缓存，参数见 result_cache.py"""
+    import result_cache
+    result_cache.main(extra)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="美食大战老鼠卡片强化最优决策模型")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="求解单个场景")
+    solve.add_argument("--model", choices=["without", "addition", "punishment", "mdp"], default="punishment",
+                       help="without/addition/punishment 对应三个模型；mdp 直接最小化失败降级下的期望总成本")
+    solve.add_argument("--vip", type=int, default=0, help="VIP等级")
+    solve.add_argument("--guild", type=int, default=0, help="公会等级")
+    solve.add_argument("--max-total", type=int, default=3, help="每次强化最多使用的副卡数")
+    solve.add_argument("--search", choices=["exhaustive", "pruned"], default="exhaustive")
+    solve.set_defaults(handler=command_solve)
+
+    # sweep、simulate 与 cache 的其余参数原样交给对应脚本，-h 显示脚本自身的帮助
+    sweep = commands.add_parser("sweep", add_help=False, help="求解所有场景并输出结果（参数见 model_with_punishment.py -h）")
+    sweep.add_argument("--model", choices=["addition", "punishment", "mdp", "coupled"], default="punishment")
+    sweep.set_defaults(handler=command_sweep)
+
+    simulate = commands.add_parser("simulate", add_help=False, help="惩罚模拟（参数见 punishment_simulation.py -h）")
+    simulate.set_defaults(handler=command_simulate)
+
+    query = commands.add_parser("query", help="查询预计算结果")
+    query.add_argument("--source", default=os.path.join("outputjson", "model_with_punishment"),
+                       help="JSON 目录或 .fvr 列式二进制文件")
+    query.add_argument("--vip", type=int, required=True, help="VIP等级")
+    query.add_argument("--guild", type=int, required=True, help="公会等级")
+    query.add_argument("--star", type=int, required=True, help="目标星级")
+    query.set_defaults(handler=command_query)
+
+    export = commands.add_parser("export", help="将 JSON 目录转换为 .fvr 列式二进制文件")
+    export.add_argument("json_dir", help="JSON 目录，例如 outputjson/model_with_punishment")
+    export.add_argument("output", help="输出文件路径，例如 outputjson/model_with_punishment.fvr")
+    export.set_defaults(handler=command_export)
+
+    cache = commands.add_parser("cache", add_help=False, help="查看与清理结果缓存（参数见 result_cache.py -h）")
+    cache.set_defaults(handler=command_cache)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ("sweep", "simulate", "cache"):
+        parser.error(f"无法识别的参数: {' '.join(extra)}")
+    args.handler(args, extra)
+
+
+if __name__ == "__main__":
+    main()
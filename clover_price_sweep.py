@@ -0,0 +1,167 @@
+"""
+Author: HPC2H2
+Date: 2025-08-22
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 四叶草市场价格网格扫描。
+             在用户给定的四叶草价格向量网格 × VIP/公会场景上求解最优策略与卡片价值，
+             结果按块流式写入磁盘上的 .npy 数组，并汇总各场景各星级最优四叶草选择发生变化的位置。
+"""
+
+import os
+import json
+import itertools
+import argparse
+
+import numpy as np
+
+from enhancement_engine import solve_enhancement_sweep, scenario_multipliers, STAR_LIMIT
+
+# 每个 (VIP, 公会, 星级) 最多记录的切换位置数，超出部分只计数
+MAX_RECORDED_FLIPS = 20
+
+
+def price_grid(base_prices, axes):
+    """
+    以 base_prices 为基准，对指定四叶草等级的价格取笛卡尔积构造价格网格
+
+    Args:
+        base_prices: 基准四叶草价格 (n_clovers,)
+        axes: {四叶草等级下标: 该等级的价格取值序列}
+
+    Returns:
+        价格网格 (n_points, n_clovers)，最后一个轴变化最快
+    """
+    base_prices = np.asarray(base_prices, dtype=float)
+    levels = list(axes)
+    values = np.array(list(itertools.product(*(axes[level] for level in levels))), dtype=float)
+    grid = np.tile(base_prices, (len(values), 1))
+    if levels:
+        grid[:, levels] = values
+    return grid
+
+
+def clover_price_sweep(output_dir, prices, p_list, clover_additions, VIP_additions, guild_additions,
+                       punishment_factors=None, star_limit=STAR_LIMIT, max_total=3, chunk_size=64,
+                       grid_shape=None):
+    """
+    对价格网格中的每个价格向量求解所有 VIP × 公会场景，按块写入磁盘
+
+    输出目录包含：
+        prices.npy: 价格网格 (n_points, n_clovers)
+        Vcard_mins.npy: 卡片价值 (n_points, VIP, 公会, star_limit + 1)，float64
+        clover_indices.npy: 最优四叶草等级下标 (n_points, VIP, 公会, star_limit + 1)，int8
+        clover_flips.json: 沿各价格轴相邻的价格点之间最优四叶草选择发生变化的位置汇总
+
+    Args:
+        output_dir: 输出目录
+        prices: 价格网格 (n_points, n_clovers)，见 price_grid
+        chunk_size: 每块同时求解的价格点数，决定内存占用
+        grid_shape: 价格网格各轴的点数（最后一个轴变化最快），None 表示只有一个轴；
+                    只比较沿同一轴相邻的价格点，快轴从最大值回到最小值处不算切换
+
+    Returns:
+        切换汇总字典
+    """
+    prices = np.asarray(prices, dtype=float)
+    n_points = len(prices)
+    grid_shape = (n_points,) if grid_shape is None else tuple(grid_shape)
+    if int(np.prod(grid_shape)) != n_points:
+        raise ValueError(f"价格网格形状 {grid_shape} 与价格点数 {n_points} 不一致")
+    # 沿各轴前进一格时价格点下标的增量
+    strides = [int(np.prod(grid_shape[axis + 1:])) for axis in range(len(grid_shape))]
+    multipliers = scenario_multipliers(VIP_additions, guild_additions)
+    scenario_shape = multipliers.shape
+    os.makedirs(output_dir, exist_ok=True)
+
+    np.save(os.path.join(output_dir, "prices.npy"), prices)
+    values_out = np.lib.format.open_memmap(
+        os.path.join(output_dir, "Vcard_mins.npy"), mode="w+", dtype=np.float64,
+        shape=(n_points,) + scenario_shape + (star_limit + 1,))
+    clovers_out = np.lib.format.open_memmap(
+        os.path.join(output_dir, "clover_indices.npy"), mode="w+", dtype=np.int8,
+        shape=(n_points,) + scenario_shape + (star_limit + 1,))
+
+    flip_counts = np.zeros(scenario_shape + (star_limit + 1,), dtype=np.int64)
+    flips = {}
+    for start in range(0, n_points, chunk_size):
+        chunk = prices[start:start + chunk_size]
+        chunk_multipliers = np.broadcast_to(multipliers, (len(chunk),) + scenario_shape)
+        chunk_prices = chunk.reshape((len(chunk),) + (1,) * len(scenario_shape) + (-1,))
+        result = solve_enhancement_sweep(p_list, clover_additions, chunk_prices, chunk_multipliers,
+                                         punishment_factors, star_limit, max_total)
+        clover_indices = result["clover_indices"].astype(np.int8)
+        values_out[start:start + len(chunk)] = result["Vcard_mins"]
+        clovers_out[start:start + len(chunk)] = clover_indices
+
+        # 沿每个轴与前一个价格点比较，前一个点可能在之前的块中，从已写入的数组读取
+        points = np.arange(start, start + len(chunk))
+        for axis, (size, stride) in enumerate(zip(grid_shape, strides)):
+            inner = (points // stride) % size > 0
+            if not inner.any():
+                continue
+            current = points[inner]
+            before = clovers_out[current - stride]
+            after = clover_indices[inner]
+            changed = before != after
+            flip_counts += changed.sum(axis=0)
+            for row, *key in zip(*np.nonzero(changed)):
+                key = tuple(int(v) for v in key)
+                recorded = flips.setdefault(key, [])
+                if len(recorded) < MAX_RECORDED_FLIPS:
+                    # 价格向量可由 prices.npy 按价格点下标取得，不重复写入
+                    recorded.append({
+                        "价格点": int(current[row]),
+                        "相邻价格点": int(current[row] - stride),
+                        "价格轴": axis,
+                        "原四叶草等级": int(before[row][key]),
+                        "新四叶草等级": int(after[row][key])
+                    })
+
+    values_out.flush()
+    clovers_out.flush()
+    summary = {
+        "价格点数": n_points,
+        "网格形状": list(grid_shape),
+        "场景形状": list(scenario_shape),
+        "切换": [
+            {"VIP等级": key[0], "公会等级": key[1], "星级": key[2],
+             "切换次数": int(flip_counts[key]), "切换位置": recorded}
+            for key, recorded in sorted(flips.items())
+        ]
+    }
+    with open(os.path.join(output_dir, "clover_flips.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=4)
+    return summary
+
+
+def main():
+    import model_with_punishment as model
+
+    parser = argparse.ArgumentParser(description="四叶草市场价格网格扫描")
+    parser.add_argument("--axis", action="append", default=[], metavar="LEVEL:MIN:MAX:POINTS",
+                        help="对第 LEVEL 级四叶草的价格在 [MIN, MAX] 上取 POINTS 个点，可重复指定")
+    parser.add_argument("--output-dir", default=os.path.join("outputjson", "clover_price_sweep"))
+    parser.add_argument("--chunk-size", type=int, default=64, help="每块同时求解的价格点数")
+    args = parser.parse_args()
+
+    axes = {}
+    for axis in args.axis:
+        level, low, high, points = axis.split(":")
+        axes[int(level)] = np.linspace(float(low), float(high), int(points))
+    prices = price_grid(model.Vclovers, axes)
+
+    summary = clover_price_sweep(
+        args.output_dir, prices, model.p_list, model.clover_additions,
+        model.VIP_additions, model.guild_additions,
+        punishment_factors=model.load_punishment_factors(),
+        star_limit=model.STAR_LIMIT, chunk_size=args.chunk_size,
+        grid_shape=tuple(len(values) for values in axes.values()) or None
+    )
+    print(f"共 {summary['价格点数']} 个价格点，{len(summary['切换'])} 个 (VIP, 公会, 星级) 的最优四叶草选择发生切换")
+    print(f"结果已保存到 {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
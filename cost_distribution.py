@@ -0,0 +1,263 @@
+"""
+Author: HPC2H2
+Date: 2025-08-31
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 强化成本的完整概率分布。
+             模型与模拟器只给出期望值；本模块对给定策略表精确计算各星级强化成本与尝试次数的分布
+             （含副卡本身的随机成本与失败降级后重新强化的循环），返回所有场景所有星级的
+             累积分布函数与分位数，例如“14→15 有 90% 的把握成本不超过 X”。
+
+             c → c+1 的成本 T 为几何分布次尝试的复合：每次尝试消耗材料 A（副卡成本之和加四叶草），
+             每次失败另需重新强化回 c 星的成本 B（降级 d 星时为 T[c-d] + ... + T[c-1]），
+             其特征函数为 φ_T = p·φ_A / (1 - (1-p)·φ_A·φ_B)。所有分量都只依赖更低星级，
+             按星级自下而上在离散网格上用 FFT 计算，各场景同时处理。
+"""
+
+import argparse
+
+import numpy as np
+
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def _rebin(pmf, step, new_step):
+    """
+    将网格间距为 step 的分布重新离散到间距 new_step 的网格上
+
+    每个点的概率按距离线性分到相邻两个新网格点，保持均值不变；超出网格的部分计入最后一格。
+
+    Args:
+        pmf: 各行的概率质量 (n, L)
+        step: 原网格间距 (n,)
+        new_step: 新网格间距 (n,)
+    """
+    n, length = pmf.shape
+    position = np.arange(length) * (step / new_step)[:, None]
+    low = np.floor(position)
+    frac = position - low
+    low = np.minimum(low.astype(np.int64), length - 1)
+    high = np.minimum(low + 1, length - 1)
+    offsets = np.arange(n)[:, None] * length
+    out = np.bincount((offsets + low).ravel(), (pmf * (1 - frac)).ravel(), n * length)
+    out += np.bincount((offsets + high).ravel(), (pmf * frac).ravel(), n * length)
+    return out.reshape(n, length)
+
+
+def _point_mass(values, step, length):
+    """取值 values 的确定分布在间距 step 的网格上的概率质量 (n, L)"""
+    position = np.asarray(values, dtype=float) / step
+    low = np.floor(position)
+    frac = position - low
+    low = np.minimum(low.astype(np.int64), length - 1)
+    pmf = np.zeros((len(position), length))
+    rows = np.arange(len(position))
+    pmf[rows, low] += 1 - frac
+    pmf[rows, np.minimum(low + 1, length - 1)] += frac
+    return pmf
+
+
+def _compound_moments(p, mean_a, var_a, mean_b, var_b):
+    """T = A_1 + ... + A_N + B_1 + ... + B_{N-1}，N ~ 几何分布(p) 的均值与方差"""
+    mean = mean_a / p + (1 - p) / p * mean_b
+    var = var_a / p + (1 - p) / p * var_b + (1 - p) / p ** 2 * (mean_a + mean_b) ** 2
+    return mean, var
+
+
+def _to_pmf(spectrum, length):
+    """
+    逆变换回长度 L 的概率质量
+
+    变换长度为 2L（补零），网格内各分量之和不会折回；超出网格的部分计入最后一格，
+    并去掉舍入产生的微小负值后归一化。
+    """
+    pmf = np.maximum(np.fft.irfft(spectrum, n=2 * length), 0)
+    pmf[:, length - 1] += pmf[:, length:].sum(axis=-1)
+    pmf = pmf[:, :length]
+    return pmf / pmf.sum(axis=-1, keepdims=True)
+
+
+class CostDistribution:
+    """各场景各星级的离散分布：网格点 j 对应取值 j × step"""
+
+    def __init__(self, steps, cdf, mean, std):
+        """
+        Args:
+            steps: 网格间距 (..., star_limit + 1)
+            cdf: 累积分布函数 (..., star_limit + 1, L)
+            mean: 精确均值（由矩递推得到，不受离散化影响）(..., star_limit + 1)
+            std: 精确标准差 (..., star_limit + 1)
+        """
+        self.steps = steps
+        self.cdf = cdf
+        self.mean = mean
+        self.std = std
+
+    @property
+    def values(self):
+        """各网格点的取值 (..., star_limit + 1, L)"""
+        return self.steps[..., None] * np.arange(self.cdf.shape[-1])
+
+    def quantile(self, q):
+        """
+        分位数：累积概率首次达到 q 的网格点取值，精度为一个网格间距
+
+        Args:
+            q: 概率，标量或序列
+
+        Returns:
+            (..., star_limit + 1) 数组；q 为序列时最后增加一维
+        """
+        q = np.asarray(q, dtype=float)
+        index = (self.cdf[..., None] < q).sum(axis=-2) if q.ndim else (self.cdf < q).sum(axis=-1)
+        index = np.minimum(index, self.cdf.shape[-1] - 1)
+        return index * (self.steps[..., None] if q.ndim else self.steps)
+
+    def probability_below(self, x):
+        """P(成本 <= x)，x 可与场景、星级形状广播，网格点之间线性插值"""
+        position = np.asarray(x, dtype=float) / self.steps
+        low = np.clip(np.floor(position).astype(np.int64), 0, self.cdf.shape[-1] - 1)
+        high = np.minimum(low + 1, self.cdf.shape[-1] - 1)
+        frac = np.clip(position - low, 0, 1)
+        take = lambda index: np.take_along_axis(self.cdf, index[..., None], axis=-1)[..., 0]
+        below = take(low) * (1 - frac) + take(high) * frac
+        return np.where(position < 0, 0.0, below)
+
+
+def cost_distributions(result, Vclovers=(0,), downgrade_levels=None, resolution=2048, tail=25):
+    """
+    计算策略表下各星级的成本与尝试次数分布
+
+    Args:
+        result: solve_enhancement_sweep / solve_enhancement 的返回值（任意场景形状），使用其中的
+                card_counts、clover_indices 与 probabilities
+        Vclovers: 各四叶草等级的价值
+        downgrade_levels: 降级表 {主卡当前星级: 失败后降级数}，None 表示失败不降级
+        resolution: 每个分布的网格点数 L
+        tail: 网格覆盖到 均值 + tail × 标准差，超出部分的概率计入最后一格，
+              对几何分布类的尾部 25 已足以使误差低于 1e-9
+
+    Returns:
+        字典，各项为 CostDistribution，星级维下标 i 表示：
+            card_cost: 从 0 星卡强化出一张 i 星卡片的总成本（以 0 星卡计，含四叶草价值）
+            step_cost: 主卡从 i-1 星强化到 i 星的成本，含失败降级后重新强化的成本
+            step_attempts: 主卡从 i-1 星强化到 i 星的强化次数，含失败降级后重新强化的次数
+    """
+    card_counts = np.asarray(result["card_counts"])
+    shape = card_counts.shape[:-2]
+    star_limit = card_counts.shape[-2] - 1
+    card_counts = card_counts.reshape(-1, star_limit + 1, 3)
+    clover_indices = np.asarray(result["clover_indices"]).reshape(-1, star_limit + 1)
+    probabilities = np.minimum(np.asarray(result["probabilities"], dtype=float).reshape(-1, star_limit + 1), 1)
+    n = len(card_counts)
+    Vclovers = np.asarray(Vclovers, dtype=float)
+    downgrade_levels = downgrade_levels or {}
+    length = resolution
+
+    # card: X[i]，step: T[i]（i-1 → i），attempts: N[i]
+    names = ("card_cost", "step_cost", "step_attempts")
+    mean = {name: np.zeros((n, star_limit + 1)) for name in names}
+    var = {name: np.zeros((n, star_limit + 1)) for name in names}
+    steps = {name: np.ones((n, star_limit + 1)) for name in names}
+    pmf = {name: np.zeros((n, star_limit + 1, length)) for name in names}
+    mean["card_cost"][:, 0] = 1
+    steps["card_cost"][:, 0] = 2 / length
+    pmf["card_cost"][:, 0, length // 2] = 1
+    for name in ("step_cost", "step_attempts"):
+        pmf[name][:, 0, 0] = 1
+
+    def spectrum(name, star, step):
+        return np.fft.rfft(_rebin(pmf[name][:, star], steps[name][:, star], step), n=2 * length)
+
+    for i in range(1, star_limit + 1):
+        c = i - 1
+        p = probabilities[:, i]
+        sub_stars = [max(i - 1 - t, 0) for t in range(3)]
+        counts = card_counts[:, i]
+        clover_values = Vclovers[clover_indices[:, i]]
+        recovery = range(c - min(downgrade_levels.get(c, 0), c), c)
+
+        # 精确的均值与方差，用于确定网格范围并作为分布的汇总值
+        mean_a = clover_values + sum(counts[:, t] * mean["card_cost"][:, s] for t, s in enumerate(sub_stars))
+        var_a = sum(counts[:, t] * var["card_cost"][:, s] for t, s in enumerate(sub_stars))
+        mean_b = sum((mean["step_cost"][:, j + 1] for j in recovery), np.zeros(n))
+        var_b = sum((var["step_cost"][:, j + 1] for j in recovery), np.zeros(n))
+        mean["step_cost"][:, i], var["step_cost"][:, i] = _compound_moments(p, mean_a, var_a, mean_b, var_b)
+        mean["card_cost"][:, i] = mean["card_cost"][:, c] + mean["step_cost"][:, i]
+        var["card_cost"][:, i] = var["card_cost"][:, c] + var["step_cost"][:, i]
+        mean["step_attempts"][:, i], var["step_attempts"][:, i] = _compound_moments(
+            p, 1, 0,
+            sum((mean["step_attempts"][:, j + 1] for j in recovery), np.zeros(n)),
+            sum((var["step_attempts"][:, j + 1] for j in recovery), np.zeros(n)))
+
+        # 成本：T[i] 与 X[i] = X[i-1] + T[i] 共用覆盖 X[i] 的网格
+        step = (mean["card_cost"][:, i] + tail * np.sqrt(var["card_cost"][:, i])) / (length - 1)
+        spectrum_a = np.fft.rfft(_point_mass(clover_values, step, length), n=2 * length)
+        for t, s in enumerate(sub_stars):
+            if counts[:, t].any():
+                spectrum_a = spectrum_a * spectrum("card_cost", s, step) ** counts[:, t, None]
+        spectrum_b = np.ones_like(spectrum_a)
+        for j in recovery:
+            spectrum_b = spectrum_b * spectrum("step_cost", j + 1, step)
+        step_spectrum = p[:, None] * spectrum_a / (1 - (1 - p[:, None]) * spectrum_a * spectrum_b)
+        steps["step_cost"][:, i] = steps["card_cost"][:, i] = step
+        pmf["step_cost"][:, i] = _to_pmf(step_spectrum, length)
+        pmf["card_cost"][:, i] = _to_pmf(spectrum("card_cost", c, step) * step_spectrum, length)
+
+        # 尝试次数：每次尝试计 1 次，失败后加上重新强化的次数
+        step = np.maximum((mean["step_attempts"][:, i] + tail * np.sqrt(var["step_attempts"][:, i]))
+                          / (length - 1), 1)
+        spectrum_a = np.fft.rfft(_point_mass(np.ones(n), step, length), n=2 * length)
+        spectrum_b = np.ones_like(spectrum_a)
+        for j in recovery:
+            spectrum_b = spectrum_b * spectrum("step_attempts", j + 1, step)
+        steps["step_attempts"][:, i] = step
+        pmf["step_attempts"][:, i] = _to_pmf(
+            p[:, None] * spectrum_a / (1 - (1 - p[:, None]) * spectrum_a * spectrum_b), length)
+
+    return {
+        name: CostDistribution(
+            steps[name].reshape(shape + (star_limit + 1,)),
+            np.minimum(np.cumsum(pmf[name], axis=-1), 1).reshape(shape + (star_limit + 1, length)),
+            mean[name].reshape(shape + (star_limit + 1,)),
+            np.sqrt(var[name]).reshape(shape + (star_limit + 1,)))
+        for name in names
+    }
+
+
+def main():
+    import model_with_punishment as model
+    from enhancement_engine import solve_enhancement_sweep, scenario_multipliers
+
+    parser = argparse.ArgumentParser(description="各星级强化成本与尝试次数的完整概率分布")
+    parser.add_argument("--vip", type=int, default=0, help="VIP等级")
+    parser.add_argument("--guild", type=int, default=0, help="公会等级")
+    parser.add_argument("--solver", choices=["punishment", "mdp"], default="punishment",
+                        help="使用的策略表，见 model_with_punishment.py")
+    parser.add_argument("--quantiles", type=float, nargs="+", default=list(DEFAULT_QUANTILES))
+    parser.add_argument("--resolution", type=int, default=2048, help="每个分布的网格点数")
+    args = parser.parse_args()
+
+    kwargs = ({"downgrade_levels": model.downgrade_levels} if args.solver == "mdp"
+              else {"punishment_factors": model.load_punishment_factors()})
+    # 所有场景一次求解并计算分布
+    sweep = solve_enhancement_sweep(model.p_list, model.clover_additions, model.Vclovers,
+                                    scenario_multipliers(model.VIP_additions, model.guild_additions),
+                                    star_limit=model.STAR_LIMIT, **kwargs)
+    distributions = cost_distributions(sweep, model.Vclovers, model.downgrade_levels, args.resolution)
+
+    index = (args.vip, args.guild)
+    print(f"VIP等级 {args.vip}，公会等级 {args.guild}，失败按降级表降级")
+    for name, title in (("step_cost", "单步成本"), ("card_cost", "卡片总成本"), ("step_attempts", "单步强化次数")):
+        distribution = distributions[name]
+        quantiles = distribution.quantile(args.quantiles)[index]
+        print(f"\n{title}：星级  均值  标准差  " + "  ".join(f"q{q:g}" for q in args.quantiles))
+        for i in range(1, model.STAR_LIMIT + 1):
+            label = f"{i}星" if name == "card_cost" else f"{i - 1}→{i}"
+            print(f"{label}  {distribution.mean[index][i]:.6g}  {distribution.std[index][i]:.6g}  "
+                  + "  ".join(f"{value:.6g}" for value in quantiles[i]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Author: HPC2H2
+Date: 2025-09-04
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 模型卡片价值与惩罚模拟的不动点耦合求解。
+             惩罚模拟默认用 2 的幂次作为每次尝试的成本，而模型把得到的惩罚因子用在自己的卡片价值上，
+             两者并不一致。本模块把求得的卡片价值与所选策略的成功率交给马尔可夫链，
+             重新计算各场景自己的惩罚因子，再用新的因子求解，直到两者自洽。
+
+             第 i 星的惩罚因子只依赖更低星级的卡片价值与第 i 星及以下的成功率，
+             因此每轮从第一个不自洽的星级起逐星级更新（Gauss-Seidel），
+             以上一轮的解作为成功率的预测值（热启动），只重算尚未自洽的场景。
+             通常一轮即达到不动点，整个耦合求解只相当于几次完整求解的开销。
+
+用法：
+    python model_with_punishment.py --solver coupled
+"""
+
+import time
+
+import numpy as np
+
+from enhancement_engine import solve_enhancement_sweep, STAR_LIMIT
+from punishment_simulation import PunishmentSimulator, BASE_CARD_VALUES, SUCCESS_RATES
+from instrumentation import metrics
+
+
+def solve_coupled(p_list, clover_additions=(1,), Vclovers=(0,), multipliers=1, punishment_factors=None,
+                  downgrade_levels=None, star_limit=STAR_LIMIT, max_total=3, tolerance=1e-10,
+                  max_iterations=50, search="exhaustive", verbose=True):
+    """
+    求解卡片价值与惩罚因子的不动点
+
+    Args:
+        p_list, clover_additions, Vclovers, multipliers, star_limit, max_total, search:
+            同 solve_enhancement_sweep
+        punishment_factors: 初始惩罚因子字典 {星级: 惩罚因子}，None 表示从不考虑惩罚（因子为 1）开始
+        downgrade_levels: 降级表 {主卡当前星级: 失败后降级数}，用于计算惩罚因子
+        tolerance: 按当前解重新计算的惩罚因子与所用因子的最大相对差（残差）不超过该值时视为收敛
+        max_iterations: 最多迭代轮数（不含第 0 轮的完整求解），同时限制每个星级的修正次数
+        verbose: 是否逐轮打印收敛情况
+
+    Returns:
+        (result, factors, history)：
+            result: 与 solve_enhancement_sweep 相同的字典
+            factors: 各场景各星级的惩罚因子 (..., star_limit + 1)，与 result 自洽
+            history: 每轮一个字典，含 iteration、scenarios（重算场景数）、start_star（重算起始星级）、
+                     evaluations（求值的星级次数）、residual（本轮开始时的惩罚因子残差）、
+                     value_change（卡片价值的最大相对变化，第 0 轮两者为 None）与 seconds；
+                     最后一项的 converged 表示是否在 max_iterations 轮内收敛
+    """
+    simulator = PunishmentSimulator(BASE_CARD_VALUES, SUCCESS_RATES, downgrade_levels or {})
+    shape = np.shape(multipliers)
+    multipliers = np.asarray(multipliers, dtype=float).reshape(-1)
+    n_scenarios = multipliers.size
+    Vclovers = np.asarray(Vclovers, dtype=float)[..., :len(clover_additions)]
+    Vclovers = np.broadcast_to(Vclovers, shape + Vclovers.shape[-1:]).reshape(n_scenarios, -1)
+
+    factors = np.ones((n_scenarios, star_limit + 1))
+    if punishment_factors is not None:
+        for i in range(7, star_limit + 1):
+            factors[:, i] = punishment_factors[i]
+    kwargs = dict(p_list=p_list, clover_additions=clover_additions, star_limit=star_limit,
+                  max_total=max_total, search=search)
+
+    def report(entry):
+        history.append(entry)
+        if verbose and entry["residual"] is None:
+            print(f"第 0 轮：以初始惩罚因子完整求解 {entry['scenarios']} 个场景，耗时 {entry['seconds']:.3f}s")
+        elif verbose:
+            print(f"第 {entry['iteration']} 轮：重算 {entry['scenarios']} 个场景（自 {entry['start_star']} 星起，"
+                  f"求值 {entry['evaluations']} 个星级），惩罚因子残差 {entry['residual']:.3g}，"
+                  f"卡片价值最大相对变化 {entry['value_change']:.3g}，耗时 {entry['seconds']:.3f}s")
+
+    def factors_of(solution):
+        """按当前解计算的惩罚因子"""
+        return simulator.markov_factors(solution["Vcard_mins"], solution["probabilities"])
+
+    history = []
+    start = time.perf_counter()
+    # 第 0 轮：用初始惩罚因子完整求解，作为之后逐星级更新时的预测值
+    with metrics.timer("coupled_iteration", iteration=0):
+        result = solve_enhancement_sweep(multipliers=multipliers, Vclovers=Vclovers,
+                                         punishment_factors={i: factors[:, i] for i in range(1, star_limit + 1)},
+                                         **kwargs)
+    report({"iteration": 0, "scenarios": n_scenarios, "start_star": 1, "evaluations": star_limit,
+            "residual": None, "value_change": None, "seconds": time.perf_counter() - start})
+
+    # 惩罚因子与当前解不自洽的场景
+    active = np.arange(n_scenarios)
+    converged = False
+    for iteration in range(1, max_iterations + 1):
+        start = time.perf_counter()
+        residual = np.abs(factors_of({key: result[key][active] for key in ("Vcard_mins", "probabilities")})
+                          - factors[active]) / factors[active]
+        unsettled = residual > tolerance
+        keep = unsettled.any(axis=1)
+        active, unsettled = active[keep], unsettled[keep]
+        if not active.size:
+            converged = True
+            break
+        start_star = int(np.flatnonzero(unsettled.any(axis=0))[0])
+
+        # 逐星级更新（Gauss-Seidel）：第 i 星的惩罚因子只依赖更低星级的卡片价值与第 i 星及以下的成功率，
+        # 而同一场景同一星级的候选共用一个因子，所选策略（成功率）几乎不受该因子影响。
+        # 因此先以上一轮第 i 星的成功率为预测计算因子，求解该星级后成功率不变即自洽，否则修正后重算
+        solution = {key: value[active] for key, value in result.items()}
+        before = solution["Vcard_mins"].copy()
+        evaluations = 0
+        with metrics.timer("coupled_iteration", iteration=iteration):
+            for i in range(start_star, star_limit + 1):
+                for _ in range(max_iterations):
+                    predicted = solution["probabilities"][:, i].copy()
+                    factors[active, i] = factors_of(solution)[:, i]
+                    solution = solve_enhancement_sweep(
+                        multipliers=multipliers[active], Vclovers=Vclovers[active],
+                        punishment_factors={j: factors[active, j] for j in range(1, star_limit + 1)},
+                        start_star=i, stop_star=i, initial=solution, **kwargs)
+                    evaluations += 1
+                    if np.array_equal(solution["probabilities"][:, i], predicted):
+                        break
+        for key, value in solution.items():
+            result[key][active] = value
+
+        report({"iteration": iteration, "scenarios": int(active.size), "start_star": start_star,
+                "evaluations": evaluations, "residual": float(residual.max()),
+                "value_change": float((np.abs(solution["Vcard_mins"] - before) / before).max()),
+                "seconds": time.perf_counter() - start})
+
+    history[-1]["converged"] = converged
+    if verbose:
+        total = sum(entry["seconds"] for entry in history)
+        print(f"{'已收敛' if converged else '未收敛'}：{len(history) - 1} 轮迭代，"
+              f"总耗时 {total:.3f}s，为首次完整求解的 {total / history[0]['seconds']:.1f} 倍")
+
+    result = {key: value.reshape(shape + value.shape[1:]) for key, value in result.items()}
+    return result, factors.reshape(shape + (star_limit + 1,)), history
@@ -0,0 +1,496 @@
+"""
+Author: HPC2H2
+Date: 2025-08-10
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 卡片强化最优决策的统一动态规划引擎。
+             model_without_addition.py、model_with_addition.py 与 model_with_punishment.py
+             共用此模块，每个星级对所有（卡片组合 × 四叶草等级）候选一次性向量化求值。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from generate_combinations import generate_combination_counts
+from strategy_builder import StrategyRecord, CLOVER_LEVELS, engine_probability
+from instrumentation import metrics
+from tracing import tracer, TRACE_STAR, TRACE_CANDIDATE
+
+STAR_LIMIT = 16
+# 副卡类型顺序：同星、低一星、低二星，对应 p_list 的第 3、2、1 行
+P_LIST_ROWS = (3, 2, 1)
+
+
+def combination_sequences(dim, max_total=3):
+    """
+    将卡片组合的数量向量展开为按放入顺序排列的副卡类型下标表
+
+    Args:
+        dim: 维度 (2或3)
+        max_total: 卡牌总数上限
+
+    Returns:
+        (各组合的卡片数量数组 (n_combos, 3), 副卡类型下标数组 (n_combos, max_total))，
+        类型下标 0/1/2 分别对应同星/低一星/低二星，-1 表示该位置没有卡片
+    """
+    counts = generate_combination_counts(dim=dim, max_total=max_total, exclude_zero=True)
+    counts = np.pad(counts, ((0, 0), (0, 3 - dim)))
+    # 第 j 张卡的类型为满足 j < 前 t+1 类卡累计数量的最小 t
+    boundaries = np.cumsum(counts, axis=1)
+    positions = np.arange(max_total)
+    sequences = (positions[None, :, None] >= boundaries[:, None, :]).sum(axis=2)
+    sequences[positions[None, :] >= boundaries[:, -1:]] = -1
+    return counts, sequences
+
+
+def combination_probabilities(sequences, type_probabilities):
+    """
+    按放入顺序计算各组合不含加成的成功概率
+
+    第一张卡取该类型的成功率，之后每张卡增加该类型成功率的 1/3，上限为 1，
+    与原模型逐卡累加的浮点运算顺序保持一致。
+
+    Args:
+        sequences: 副卡类型下标数组 (n_combos, max_total)
+        type_probabilities: 各类型副卡的成功率 (3,)
+
+    Returns:
+        成功概率数组 (n_combos,)
+    """
+    probabilities = type_probabilities[sequences[:, 0]]
+    for j in range(1, sequences.shape[1]):
+        present = sequences[:, j] >= 0
+        stepped = np.minimum(probabilities + type_probabilities[sequences[:, j]] / 3, 1)
+        probabilities = np.where(present, stepped, probabilities)
+    return probabilities
+
+
+def star_tables(p_list, star_limit=STAR_LIMIT, max_total=3):
+    """
+    各星级候选组合的数量向量与不含加成的成功概率表
+
+    这些量只依赖成功率表，与场景、卡片价值和四叶草无关，因此按输入缓存，
+    被所有场景和所有求解调用复用。
+
+    Args:
+        p_list: 成功率表
+        star_limit: 最大星级
+        max_total: 副卡数量上限
+
+    Returns:
+        列表，下标为目标星级（2 及以上有效），元素为
+        (卡片数量数组 (n_combos, 3), 副卡类型下标数组 (n_combos, max_total), 成功概率数组 (n_combos,))
+    """
+    rows = tuple(tuple(p_list[row][1:star_limit + 1]) for row in P_LIST_ROWS)
+    return _star_tables(rows, star_limit, max_total)
+
+
+@lru_cache(maxsize=32)
+def _star_tables(rows, star_limit, max_total):
+    tables = [None] * (star_limit + 1)
+    for i in range(2, star_limit + 1):
+        counts, sequences = combination_sequences(2 if i == 2 else 3, max_total)
+        type_probabilities = np.array([row[i - 1] for row in rows], dtype=float)
+        base_p = combination_probabilities(sequences, type_probabilities)
+        for array in (counts, sequences, base_p):
+            array.setflags(write=False)
+        tables[i] = (counts, sequences, base_p)
+    return tables
+
+
+def combination_costs(sequences, type_values):
+    """
+    按放入顺序累加各组合的副卡价值
+
+    Args:
+        sequences: 副卡类型下标数组 (n_combos, max_total)
+        type_values: 各类型副卡的价值 (..., 3)，前导维度为场景维度
+
+    Returns:
+        材料成本数组 (..., n_combos)
+    """
+    costs = np.zeros(type_values.shape[:-1] + (sequences.shape[0],))
+    for j in range(sequences.shape[1]):
+        costs = costs + np.where(sequences[:, j] >= 0, type_values[..., sequences[:, j]], 0)
+    return costs
+
+
+def candidate_scores(base_p, base_cost, clover_additions, Vclovers, multipliers, recovery=None, factor=None):
+    """
+    对（场景 × 组合 × 四叶草等级）候选求值
+
+    Args:
+        base_p: 各组合不含加成的成功率 (n_combos,)
+        base_cost: 各场景各组合的材料成本 (n_scenarios, n_combos)
+        clover_additions: 四叶草加成 (K,)，或每个场景各自的 (n_scenarios, K)
+        Vclovers: 四叶草价值 (n_scenarios, K)
+        multipliers: 各场景的加成倍数 (n_scenarios,)
+        recovery: 失败降级后重新强化回当前星级的成本 (n_scenarios,)，None 表示不降级
+        factor: 惩罚因子，None 表示按期望成本选择
+
+    Returns:
+        (成功概率, 期望成本, 排序键)，形状均为 (n_scenarios, n_combos, K)，
+        最优候选为排序键最小者中最先出现的一个
+    """
+    clover_additions = np.atleast_2d(clover_additions)[:, None, :]
+    cur_p = np.minimum(base_p[None, :, None] * clover_additions * multipliers[:, None, None], 1)
+    cur_cost = (base_cost[:, :, None] + Vclovers[:, None, :]) / cur_p
+    if recovery is not None:
+        # 失败后主卡降级，需要从 c-d 星重新强化回 c 星
+        cur_cost = cur_cost + (1 - cur_p) * recovery[:, None, None] / cur_p
+    if factor is None:
+        return cur_p, cur_cost, cur_cost
+    expected_cost = cur_cost * factor
+    effectiveness = np.where(expected_cost > 0, cur_p / expected_cost, 0)
+    return cur_p, expected_cost, -effectiveness
+
+
+def star_factor(punishment_factors, i, n_scenarios):
+    """
+    取出第 i 星的惩罚因子，6 星及以下为 1
+
+    Args:
+        punishment_factors: 惩罚因子字典 {星级: 惩罚因子}，值可以是标量，
+                            也可以是按场景（与 multipliers 形状相同）的数组
+        i: 目标星级
+        n_scenarios: 场景数
+
+    Returns:
+        None（不考虑失败惩罚）、标量，或可与候选数组广播的 (n_scenarios, 1, 1) 数组
+    """
+    if punishment_factors is None:
+        return None
+    if i < 7:
+        return 1
+    factor = punishment_factors[i]
+    if np.ndim(factor):
+        return np.asarray(factor, dtype=float).reshape(n_scenarios, 1, 1)
+    return factor
+
+
+def _undominated_combinations(base_p, base_cost):
+    """
+    去掉在所有场景中都被支配的组合
+
+    若组合 A 在枚举顺序中排在 B 之前，成功率不低于 B，且材料成本不高于 B，
+    则对任意四叶草等级 A 的排序键都不大于 B（浮点运算对成功率与成本单调），
+    B 不可能被选中（并列时取先出现者）。成功率顺序与场景无关，按成功率降序扫描，
+    用前缀最小值一次求出每个场景中 B 之前的最低成本及其组合下标。
+
+    Args:
+        base_p: 各组合不含加成的成功率 (n_combos,)
+        base_cost: 各场景各组合的材料成本 (n_scenarios, n_combos)
+
+    Returns:
+        至少在一个场景中未被支配的组合下标（升序）
+    """
+    n_combos = len(base_p)
+    order = np.lexsort((np.arange(n_combos), -base_p))
+    # 复数按 (实部, 虚部) 字典序比较：前缀最小值即最低成本，并列时取下标最小的组合
+    prefix = np.minimum.accumulate(base_cost[:, order] + 1j * order, axis=1)[:, :-1]
+    dominated = np.zeros(base_cost.shape, dtype=bool)
+    dominated[:, order[1:]] = (prefix.real <= base_cost[:, order[1:]]) & (prefix.imag < order[1:])
+    return np.flatnonzero(~dominated.all(axis=0))
+
+
+def _candidate_clovers(base_p, base_cost, clover_additions, Vclovers, multipliers, recovery=None, factor=None):
+    """
+    用界去掉不可能胜出的四叶草等级
+
+    以（最低材料成本, 最高成功率）构造每个四叶草等级的虚拟候选，其排序键是该等级下
+    所有候选排序键的下界（同样的浮点运算，单调性保证下界严格成立）。每个场景先按下界
+    最小的四叶草等级求出一个实际候选作为上界，下界严格大于所有场景上界的等级被跳过。
+
+    Returns:
+        需要求值的四叶草等级下标数组（升序）
+    """
+    n_scenarios = len(base_cost)
+    scenarios = np.arange(n_scenarios)
+    lower = candidate_scores(base_p.max(keepdims=True), base_cost.min(axis=1, keepdims=True),
+                              clover_additions, Vclovers, multipliers, recovery, factor)[2][:, 0, :]
+    first = np.argmin(lower, axis=1)
+    incumbent = candidate_scores(base_p, base_cost, clover_additions[first][:, None],
+                                  Vclovers[scenarios, first][:, None], multipliers, recovery, factor)[2]
+    incumbent = incumbent[:, :, 0].min(axis=1)
+    return np.flatnonzero((lower <= incumbent[:, None]).any(axis=0))
+
+
+def _trace_star(i, n_candidates, Vcard_mins, cost_mins, card_counts, clover_indices, probabilities):
+    """写出第 i 星各场景（按展平顺序）的最佳策略"""
+    tracer.emit("star", star=i, candidates=n_candidates,
+                card_counts=card_counts[:, i].tolist(), clover_indices=clover_indices[:, i].tolist(),
+                probabilities=probabilities[:, i].tolist(), cost=cost_mins[:, i].tolist(),
+                value=Vcard_mins[:, i].tolist())
+
+
+def _trace_candidates(i, counts, clovers, cur_p, expected_cost):
+    """写出第 i 星每个（组合, 四叶草等级）候选在各场景的成功概率与期望成本"""
+    for index in range(cur_p.shape[1]):
+        comb, k = divmod(index, len(clovers))
+        tracer.emit("candidate", star=i, card_counts=counts[comb].tolist(), clover=int(clovers[k]),
+                    probabilities=cur_p[:, index].tolist(), cost=expected_cost[:, index].tolist())
+
+
+def scenario_multipliers(VIP_additions, guild_additions, *extra_additions):
+    """
+    构造所有场景的加成倍数网格 (1 + 公会加成 + VIP加成 + 其他加成...)
+
+    Args:
+        VIP_additions: 各VIP等级的加成
+        guild_additions: 各公会等级的加成
+        extra_additions: 其他加成列表（如活动、新VIP档位），每个列表增加一个维度
+
+    Returns:
+        加成倍数数组，形状为 (len(VIP_additions), len(guild_additions), len(extra_1), ...)
+    """
+    multipliers = 1 + np.asarray(guild_additions, dtype=float)[None, :] \
+        + np.asarray(VIP_additions, dtype=float)[:, None]
+    for extra in extra_additions:
+        multipliers = multipliers[..., None] + np.asarray(extra, dtype=float)
+    return multipliers
+
+
+def solve_enhancement_sweep(p_list, clover_additions=(1,), Vclovers=(0,), multipliers=1,
+                            punishment_factors=None, star_limit=STAR_LIMIT, max_total=3,
+                            start_star=1, initial=None, downgrade_levels=None, search="exhaustive",
+                            stop_star=None):
+    """
+    对一组加成场景同时逐星级求解卡片强化最优策略
+
+    场景作为数组维度参与广播，每个星级对所有（场景 × 卡片组合 × 四叶草等级）
+    候选一次性求值。不传 punishment_factors 时按最低期望成本（材料成本/成功率）
+    选择策略；传入时按惩罚模型的性价比（成功率/期望成本）选择，7星及以上的
+    期望成本乘以惩罚因子。
+
+    传入 downgrade_levels 时直接最小化失败降级下的期望总成本（马尔可夫决策过程）：
+    主卡从 c 星只能升到 c+1 星或降到更低星级，因此 c → c+1 的最优期望成本为
+        min (材料成本 + (1 - p) × 从 c-d 星重新强化回 c 星的成本) / p，
+    其中重新强化的成本 Vcard_mins[c] - Vcard_mins[c-d] 只依赖更低星级的最优解，
+    逐星级一次求解即为精确最优，无需迭代。
+
+    Args:
+        p_list: 成功率表
+        clover_additions: 各四叶草等级的概率加成倍数
+        Vclovers: 各四叶草等级的价值，形状 (n_clovers,)；也可带与 multipliers 相同的前导维度，
+                  为每个场景指定不同的四叶草价格
+        multipliers: 各场景的加成倍数，任意形状，见 scenario_multipliers
+        punishment_factors: 惩罚因子字典 {星级: 惩罚因子}，None 表示不考虑失败惩罚；
+                            因子也可以是与 multipliers 形状相同的数组，为每个场景指定不同的惩罚因子
+        star_limit: 最大星级
+        max_total: 副卡数量上限
+        start_star: 从该星级开始求解，更低星级的结果取自 initial
+        initial: 之前求解的结果（场景形状与 multipliers 相同），start_star > 1 时必须提供
+        downgrade_levels: 降级表 {主卡当前星级: 失败后降级数}，与 punishment_factors 不能同时使用
+        search: "exhaustive" 对所有候选求值；"pruned" 先去掉被支配的组合（成本更高且成功率不更高）
+                并用界跳过不可能胜出的四叶草等级，结果与穷举完全相同，适合较大的 max_total
+        stop_star: 求解到该星级为止，None 表示 star_limit；更高星级的结果取自 initial
+
+    Returns:
+        字典，各项的前导维度与 multipliers 形状相同：
+            Vcard_mins: 各星级卡片价值 (..., star_limit + 1)
+            cost_mins: 各星级强化成本 (..., star_limit + 1)
+            cost_effectiveness: 各星级最佳策略的性价比，仅惩罚模型与降级模型有意义 (..., star_limit + 1)
+            card_counts: 各星级所用同星/低一星/低二星副卡数量 (..., star_limit + 1, 3)
+            clover_indices: 各星级所用四叶草等级下标 (..., star_limit + 1)
+            probabilities: 各星级最佳策略的成功概率 (..., star_limit + 1)
+    """
+    if punishment_factors is not None and downgrade_levels is not None:
+        raise ValueError("punishment_factors 与 downgrade_levels 不能同时使用")
+    clover_additions = np.asarray(clover_additions, dtype=float)
+    # 四叶草价值表可能比加成表长（如 model_with_addition.py），只取用得到的等级
+    Vclovers = np.asarray(Vclovers, dtype=float)[..., :len(clover_additions)]
+    tables = star_tables(p_list, star_limit, max_total)
+    if search not in ("exhaustive", "pruned"):
+        raise ValueError(f"未知的搜索方式: {search}")
+    shape = np.shape(multipliers)
+    multipliers = np.asarray(multipliers, dtype=float).reshape(-1)
+    n_scenarios = multipliers.size
+    scenarios = np.arange(n_scenarios)
+    Vclovers = np.broadcast_to(Vclovers, shape + Vclovers.shape[-1:]).reshape(n_scenarios, -1)
+
+    if initial is None:
+        Vcard_mins = np.full((n_scenarios, star_limit + 1), 1e9)
+        cost_mins = np.full((n_scenarios, star_limit + 1), np.inf)
+        cost_effectiveness = np.zeros((n_scenarios, star_limit + 1))
+        card_counts = np.zeros((n_scenarios, star_limit + 1, 3), dtype=np.int64)
+        clover_indices = np.zeros((n_scenarios, star_limit + 1), dtype=np.int64)
+        probabilities = np.zeros((n_scenarios, star_limit + 1))
+        Vcard_mins[:, 0] = 1
+    else:
+        # 复制之前的结果，只覆盖 start_star 及以上的星级
+        Vcard_mins, cost_mins, cost_effectiveness, card_counts, clover_indices, probabilities = (
+            np.array(initial[key]).reshape((n_scenarios,) + np.shape(initial[key])[len(shape):])
+            for key in ("Vcard_mins", "cost_mins", "cost_effectiveness",
+                        "card_counts", "clover_indices", "probabilities"))
+
+    for i in range(start_star, (star_limit if stop_star is None else stop_star) + 1):
+        if i == 1:
+            # 0→1 只能使用一张0星卡，且不计加成
+            p3 = p_list[3][i]
+            cost_mins[:, i] = Vcard_mins[:, 0] / p3
+            Vcard_mins[:, i] = Vcard_mins[:, 0] + cost_mins[:, i]
+            card_counts[:, i] = (1, 0, 0)
+            probabilities[:, i] = p3
+            if tracer.level >= TRACE_STAR:
+                _trace_star(i, 1, Vcard_mins, cost_mins, card_counts, clover_indices, probabilities)
+            continue
+
+        with metrics.timer("candidate_evaluation", star=i):
+            counts, sequences, base_p = tables[i]
+            type_values = Vcard_mins[:, [max(i - 1 - t, 0) for t in range(3)]]
+            recovery = None
+            if downgrade_levels and downgrade_levels.get(i - 1):
+                recovery = Vcard_mins[:, i-1] - Vcard_mins[:, max(i - 1 - downgrade_levels[i-1], 0)]
+            factor = star_factor(punishment_factors, i, n_scenarios)
+
+            base_cost = combination_costs(sequences, type_values)
+            clovers = np.arange(len(clover_additions))
+            if search == "pruned":
+                combos = _undominated_combinations(base_p, base_cost)
+                counts, base_p, base_cost = counts[combos], base_p[combos], base_cost[:, combos]
+                clovers = _candidate_clovers(base_p, base_cost, clover_additions, Vclovers, multipliers,
+                                             recovery, factor)
+
+            # 所有（场景 × 组合 × 四叶草等级）候选，组合与四叶草按原模型的循环顺序展平
+            cur_p, expected_cost, key = candidate_scores(
+                base_p, base_cost, clover_additions[clovers], Vclovers[:, clovers], multipliers, recovery, factor)
+            cur_p = cur_p.reshape(n_scenarios, -1)
+            expected_cost = expected_cost.reshape(n_scenarios, -1)
+            key = key.reshape(n_scenarios, -1)
+            best = np.argmin(key, axis=1)
+            if factor is not None:
+                cost_effectiveness[:, i] = -key[scenarios, best]
+            elif downgrade_levels is not None:
+                cost_effectiveness[:, i] = cur_p[scenarios, best] / expected_cost[scenarios, best]
+
+            comb, k = np.divmod(best, len(clovers))
+            cost_mins[:, i] = expected_cost[scenarios, best]
+            Vcard_mins[:, i] = Vcard_mins[:, i-1] + cost_mins[:, i]
+            card_counts[:, i] = counts[comb]
+            clover_indices[:, i] = clovers[k]
+            probabilities[:, i] = cur_p[scenarios, best]
+        metrics.count("candidates_evaluated", cur_p.size, star=i)
+        if tracer.level >= TRACE_STAR:
+            if tracer.level >= TRACE_CANDIDATE:
+                _trace_candidates(i, counts, clovers, cur_p, expected_cost)
+            _trace_star(i, cur_p.shape[1], Vcard_mins, cost_mins, card_counts, clover_indices, probabilities)
+
+    result = {
+        "Vcard_mins": Vcard_mins,
+        "cost_mins": cost_mins,
+        "cost_effectiveness": cost_effectiveness,
+        "card_counts": card_counts,
+        "clover_indices": clover_indices,
+        "probabilities": probabilities
+    }
+    return {key: value.reshape(shape + value.shape[1:]) for key, value in result.items()}
+
+
+def solve_enhancement(p_list, clover_additions=(1,), Vclovers=(0,), multiplier=1,
+                      punishment_factors=None, star_limit=STAR_LIMIT, max_total=3, downgrade_levels=None,
+                      search="exhaustive"):
+    """
+    逐星级求解单个加成场景的卡片强化最优策略
+
+    Args:
+        p_list: 成功率表
+        clover_additions: 各四叶草等级的概率加成倍数
+        Vclovers: 各四叶草等级的价值
+        multiplier: VIP、公会等额外加成倍数，即 (1 + 公会加成 + VIP加成)
+        punishment_factors: 惩罚因子字典 {星级: 惩罚因子}，None 表示不考虑失败惩罚
+        star_limit: 最大星级
+        max_total: 副卡数量上限
+        downgrade_levels: 降级表，给定时直接最小化失败降级下的期望总成本，见 solve_enhancement_sweep
+        search: 候选搜索方式，见 solve_enhancement_sweep
+
+    Returns:
+        与 solve_enhancement_sweep 相同的字典，不含场景维度
+    """
+    return solve_enhancement_sweep(p_list, clover_additions, Vclovers, multiplier,
+                                   punishment_factors, star_limit, max_total,
+                                   downgrade_levels=downgrade_levels, search=search)
+
+
+def evaluate_strategy(result, Vclovers=(0,), downgrade_levels=None):
+    """
+    计算给定策略表在失败降级下的精确期望卡片价值（策略评估）
+
+    策略固定时各星级卡片价值满足下三角线性方程组
+        V[c+1] = V[c] + (材料成本(V) + (1 - p) × (V[c] - V[c-d])) / p，
+    按星级前向代入即可精确求解，所有场景同时计算。
+    可用于比较惩罚因子启发式选出的策略与 downgrade_levels 模式的最优策略。
+
+    Args:
+        result: solve_enhancement_sweep 的返回值（任意场景形状），使用其中的
+                card_counts、clover_indices 与 probabilities
+        Vclovers: 各四叶草等级的价值
+        downgrade_levels: 降级表 {主卡当前星级: 失败后降级数}，None 表示失败不降级
+
+    Returns:
+        各星级卡片的期望价值 (..., star_limit + 1)
+    """
+    card_counts = np.asarray(result["card_counts"], dtype=float)
+    clover_indices = np.asarray(result["clover_indices"])
+    probabilities = np.asarray(result["probabilities"], dtype=float)
+    Vclovers = np.asarray(Vclovers, dtype=float)
+    downgrade_levels = downgrade_levels or {}
+    star_limit = probabilities.shape[-1] - 1
+
+    values = np.zeros(probabilities.shape)
+    values[..., 0] = 1
+    for i in range(1, star_limit + 1):
+        material = (card_counts[..., i, :] * values[..., [max(i - 1 - t, 0) for t in range(3)]]).sum(axis=-1) \
+            + Vclovers[clover_indices[..., i]]
+        recovery = values[..., i-1] - values[..., max(i - 1 - downgrade_levels.get(i - 1, 0), 0)]
+        p = probabilities[..., i]
+        values[..., i] = values[..., i-1] + (material + (1 - p) * recovery) / p
+    return values
+
+
+def scenario_result(result, index):
+    """
+    从 solve_enhancement_sweep 的结果中取出单个场景
+
+    Args:
+        result: solve_enhancement_sweep 的返回值
+        index: 场景下标，例如 (cur_vip, cur_guild)
+
+    Returns:
+        与 solve_enhancement 相同的字典
+    """
+    return {key: value[index] for key, value in result.items()}
+
+
+def strategy_record(result, i):
+    """
+    取出第 i 星的最佳策略记录
+
+    Args:
+        result: solve_enhancement 的返回值（单个场景）
+        i: 目标星级
+
+    Returns:
+        StrategyRecord，副卡按同星、低一星、低二星的顺序排列
+    """
+    cards = []
+    for t, count in enumerate(result["card_counts"][i].tolist()):
+        cards += [i - 1 - t] * count
+    return StrategyRecord(cards, int(result["clover_indices"][i]),
+                          engine_probability(float(result["probabilities"][i])), float(result["cost_mins"][i]))
+
+
+def format_strategy(result, i, clover_levels=CLOVER_LEVELS):
+    """
+    将第 i 星的最佳策略格式化为原模型的策略字符串，仅在展示或保存时调用
+
+    Args:
+        result: solve_enhancement 的返回值（单个场景）
+        i: 目标星级
+        clover_levels: 四叶草等级名称
+
+    Returns:
+        策略字符串，例如 " 使用卡片:6 四叶草等级：2 成功概率：0.2968"
+    """
+    return strategy_record(result, i).format(clover_levels)
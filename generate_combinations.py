@@ -7,6 +7,8 @@ License: MIT
 Description: generate_combinations.py
 """
 
+import numpy as np
+
 def generate_combinations(dim=2, max_total=3, exclude_zero=True):
     """生成所有可能的卡牌组合，其中各维度的和不超过max_total
     
@@ -48,3 +50,29 @@ def generate_combinations(dim=2, max_total=3, exclude_zero=True):
                         card_combinations.append(cards)
     
     return card_combinations
+
+
+def generate_combination_counts(dim=2, max_total=3, exclude_zero=True):
+    """生成所有可能卡牌组合的数量向量，顺序与 generate_combinations 一致
+    
+    不构造字符串列表，适合较大的 max_total。
+    
+    Args:
+        dim: 维度 (2或3)
+        max_total: 卡牌总数上限
+        exclude_zero: 是否排除全零的组合
+        
+    Returns:
+        形状为 (组合数, dim) 的整数数组，每行依次为 (同星卡数, 低一星卡数[, 低二星卡数])，
+        例如 ['same', 'same', 'down1'] 对应 [2, 1]
+    """
+    if dim not in (2, 3):
+        raise ValueError("dim 必须是 2 或 3")
+    
+    # C 顺序展开，最后一维变化最快，与嵌套循环的顺序相同
+    counts = np.indices((max_total + 1,) * dim).reshape(dim, -1).T
+    totals = counts.sum(axis=1)
+    valid = totals <= max_total
+    if exclude_zero:
+        valid &= totals > 0
+    return counts[valid]
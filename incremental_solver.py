@@ -0,0 +1,165 @@
+"""
+Author: HPC2H2
+Date: 2025-08-18
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 输入变化时的增量重算。
+             第 i 星的结果只依赖更低星级的卡片价值和成功率表第 i 列，
+             因此修改某个成功率、惩罚因子、四叶草或加成后，只需从受影响的最低星级开始、
+             对受影响的场景重新求解，其余结果沿用上一次的解。
+"""
+
+import json
+import hashlib
+
+import numpy as np
+
+from enhancement_engine import solve_enhancement_sweep, P_LIST_ROWS, STAR_LIMIT
+from result_cache import canonical
+
+
+def _fingerprint(*values):
+    """
+    对输入取摘要
+
+    数组按 dtype、形状与全部内容的哈希参与摘要；repr 会省略大数组的中间部分，不能用于比较
+    """
+    return hashlib.sha1(json.dumps(canonical(values), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class IncrementalSolver:
+    """保留上一次的解，只重算受输入变化影响的星级与场景"""
+
+    def __init__(self, star_limit=STAR_LIMIT, max_total=3):
+        self.star_limit = star_limit
+        self.max_total = max_total
+        self.result = None
+        self._star_fingerprints = None
+        self._clover_fingerprint = None
+        self._multipliers = None
+        # 最近一次求解的重算范围：(起始星级, 重算场景数)，起始星级为 None 表示无需重算
+        self.last_update = None
+
+    def _star_fingerprints_of(self, p_list, punishment_factors):
+        """各星级依赖的成功率表列及惩罚因子的摘要"""
+        return [
+            _fingerprint(tuple(p_list[row][i] for row in P_LIST_ROWS),
+                         None if punishment_factors is None else punishment_factors[i],
+                         punishment_factors is None)
+            for i in range(1, self.star_limit + 1)
+        ]
+
+    def solve(self, p_list, clover_additions=(1,), Vclovers=(0,), multipliers=1, punishment_factors=None):
+        """
+        求解一组场景，参数与返回值同 solve_enhancement_sweep
+
+        与上一次调用相比：
+            成功率表第 i 列或第 i 星惩罚因子变化 → 所有场景从第 i 星起重算
+            四叶草加成或价值变化 → 所有场景从第 2 星起重算（第 1 星不使用四叶草）
+            部分场景的加成倍数变化 → 这些场景从第 2 星起重算
+        以上同时发生时，每个场景从各项变化要求的最低星级起重算
+        """
+        star_fingerprints = self._star_fingerprints_of(p_list, punishment_factors)
+        n_clovers = len(clover_additions)
+        clover_fingerprint = _fingerprint(tuple(clover_additions),
+                                          np.ascontiguousarray(np.asarray(Vclovers, dtype=float)[..., :n_clovers]))
+        multipliers = np.asarray(multipliers, dtype=float)
+
+        if self.result is None or multipliers.shape != self._multipliers.shape:
+            starts = np.ones(multipliers.shape, dtype=np.int64)
+        else:
+            changed_stars = [i for i, (old, new) in enumerate(
+                zip(self._star_fingerprints, star_fingerprints), start=1) if old != new]
+            start_star = min(changed_stars) if changed_stars else None
+            if clover_fingerprint != self._clover_fingerprint:
+                start_star = 2 if start_star is None else min(start_star, 2)
+            # 各场景的重算起始星级，0 表示无需重算；
+            # 加成倍数变化的场景总要从第 2 星起重算，与成功率表等是否同时变化无关
+            starts = np.full(multipliers.shape, start_star or 0, dtype=np.int64)
+            changed = multipliers != self._multipliers
+            starts[changed] = 2 if start_star is None else min(start_star, 2)
+
+        recomputed = starts > 0
+        if not recomputed.any():
+            self.last_update = (None, 0)
+            return self.result
+
+        kwargs = dict(p_list=p_list, clover_additions=clover_additions, Vclovers=Vclovers,
+                      punishment_factors=punishment_factors, star_limit=self.star_limit,
+                      max_total=self.max_total)
+        groups = np.unique(starts[recomputed])
+        if groups.size == 1 and recomputed.all():
+            start_star = int(groups[0])
+            self.result = solve_enhancement_sweep(multipliers=multipliers, start_star=start_star,
+                                                  initial=None if start_star == 1 else self.result, **kwargs)
+        else:
+            Vclovers = np.asarray(Vclovers, dtype=float)[..., :n_clovers]
+            # 复制后再写回，不修改上一次返回给调用方的结果
+            self.result = {key: value.copy() for key, value in self.result.items()}
+            for start_star in groups.tolist():
+                group = starts == start_star
+                if Vclovers.ndim > 1:
+                    # 按场景指定的四叶草价格同样只取重算的场景
+                    kwargs["Vclovers"] = np.broadcast_to(Vclovers, multipliers.shape + (n_clovers,))[group]
+                subset = solve_enhancement_sweep(
+                    multipliers=multipliers[group], start_star=start_star,
+                    initial={key: value[group] for key, value in self.result.items()},
+                    **kwargs)
+                for key, value in subset.items():
+                    self.result[key][group] = value
+        self.last_update = (int(groups[0]), int(recomputed.sum()))
+
+        self._star_fingerprints = star_fingerprints
+        self._clover_fingerprint = clover_fingerprint
+        self._multipliers = multipliers.copy()
+        return self.result
+
+
+def verify(steps=30, seed=0):
+    """
+    回归检查：对默认配置随机修改成功率、惩罚因子、四叶草价值与部分场景的加成倍数（可同时发生），
+    每一步比较增量求解与完整求解的结果
+
+    Returns:
+        结果不一致的步数
+    """
+    import copy
+    import model_with_punishment as model
+    from enhancement_engine import scenario_multipliers
+
+    rng = np.random.default_rng(seed)
+    p_list = copy.deepcopy(model.p_list)
+    Vclovers = list(model.Vclovers)
+    factors = {i: (1.0 if i < 7 else 0.5) for i in range(1, model.STAR_LIMIT + 1)}
+    multipliers = scenario_multipliers(model.VIP_additions, model.guild_additions)
+    solver = IncrementalSolver(model.STAR_LIMIT)
+    mismatches = 0
+    for step in range(steps):
+        if step:
+            edits = rng.choice(4, size=rng.integers(1, 4), replace=False)
+            if 0 in edits:
+                i = int(rng.integers(3, model.STAR_LIMIT + 1))
+                p_list[3][i] = round(p_list[3][i] * rng.uniform(0.9, 1.1), 4)
+            if 1 in edits:
+                factors[int(rng.integers(7, model.STAR_LIMIT + 1))] = float(rng.uniform(0.2, 1))
+            if 2 in edits:
+                k = int(rng.integers(1, len(Vclovers)))
+                Vclovers[k] = Vclovers[k] * rng.uniform(0.8, 1.2)
+            if 3 in edits:
+                multipliers = multipliers.copy()
+                index = tuple(int(rng.integers(n)) for n in multipliers.shape)
+                multipliers[index] += rng.uniform(0.01, 0.05)
+        incremental = solver.solve(p_list, model.clover_additions, Vclovers, multipliers, factors)
+        full = solve_enhancement_sweep(p_list, model.clover_additions, Vclovers, multipliers, factors,
+                                       model.STAR_LIMIT, solver.max_total)
+        if not all(np.array_equal(incremental[key], full[key]) for key in full):
+            mismatches += 1
+            print(f"第 {step} 步不一致，重算范围 {solver.last_update}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    failed = verify()
+    print("增量求解与完整求解一致" if not failed else f"{failed} 步不一致")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,225 @@
+"""
+Author: HPC2H2
+Date: 2025-08-26
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 热点路径的可选计时与计数。
+             默认关闭，关闭时 timer() 返回共享的空上下文、count() 直接返回，
+             可以常驻在生产代码路径中；开启后按阶段计时、累计计数并按场景汇总，
+             导出为 JSON 或 Prometheus 文本格式。
+
+             没有命令行参数的脚本可设置环境变量 FVR_METRICS=PREFIX 开启，
+             主进程退出时导出 PREFIX.json 与 PREFIX.prom，工作进程重新导入时不会覆盖。
+"""
+
+import os
+import json
+import time
+import atexit
+import multiprocessing
+from contextlib import nullcontext
+
+# 关闭时所有 timer() 调用共用的空上下文
+_NULL_TIMER = nullcontext()
+
+
+def _format_labels(labels):
+    """将标签元组格式化为 Prometheus 标签"""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Timer:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._record(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """阶段计时器、计数器与按场景的耗时分解"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """清空已收集的指标"""
+        # (名称, 标签) -> [次数, 总秒数]
+        self.timers = {}
+        # (名称, 标签) -> 累计值
+        self.counters = {}
+        # 场景 -> {阶段: 总秒数}
+        self.scenarios = {}
+        self._scenario = None
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        return self
+
+    def timer(self, name, **labels):
+        """
+        阶段计时上下文，例如 with metrics.timer("json_write"): ...
+
+        关闭时返回共享的空上下文，不产生任何计时开销
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (name, tuple(sorted(labels.items()))))
+
+    def count(self, name, value=1, **labels):
+        """累加计数器"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def scenario(self, label):
+        """
+        场景上下文：其中的所有计时同时计入该场景的耗时分解
+
+        with metrics.scenario("VIP9_公会5"): ...
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _ScenarioScope(self, label)
+
+    def _record(self, key, seconds):
+        entry = self.timers.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        if self._scenario is not None:
+            stages = self.scenarios.setdefault(self._scenario, {})
+            stages[key[0]] = stages.get(key[0], 0.0) + seconds
+
+    def snapshot(self, reset=False):
+        """
+        取出已收集的指标，用于工作进程把指标交回主进程合并
+
+        Args:
+            reset: 取出后是否清空，工作进程每个任务取出一次，避免重复计入
+
+        Returns:
+            可 pickle 的 {"timers", "counters", "scenarios"} 字典，见 merge
+        """
+        snapshot = {
+            "timers": {key: list(entry) for key, entry in self.timers.items()},
+            "counters": dict(self.counters),
+            "scenarios": {scenario: dict(stages) for scenario, stages in self.scenarios.items()}
+        }
+        if reset:
+            self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        合并 snapshot() 取出的指标：计时的次数与秒数、计数器与场景耗时分别累加
+
+        关闭时不合并
+        """
+        if not self.enabled or not snapshot:
+            return
+        for key, (count, seconds) in snapshot["timers"].items():
+            entry = self.timers.setdefault(key, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        for key, value in snapshot["counters"].items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for scenario, stages in snapshot["scenarios"].items():
+            merged = self.scenarios.setdefault(scenario, {})
+            for stage, seconds in stages.items():
+                merged[stage] = merged.get(stage, 0.0) + seconds
+
+    def to_dict(self):
+        """导出为可 JSON 序列化的字典"""
+        return {
+            "timers": [
+                {"name": name, "labels": dict(labels), "count": count, "seconds": seconds}
+                for (name, labels), (count, seconds) in sorted(self.timers.items())
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "scenarios": self.scenarios
+        }
+
+    def to_json(self, path):
+        """导出为 JSON 文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        timer_names = sorted({name for name, _ in self.timers})
+        for name in timer_names:
+            lines.append(f"# TYPE fvr_{name}_seconds summary")
+            for (timer_name, labels), (count, seconds) in sorted(self.timers.items()):
+                if timer_name == name:
+                    lines.append(f"fvr_{name}_seconds_sum{_format_labels(labels)} {seconds!r}")
+                    lines.append(f"fvr_{name}_seconds_count{_format_labels(labels)} {count}")
+
+        counter_names = sorted({name for name, _ in self.counters})
+        for name in counter_names:
+            lines.append(f"# TYPE fvr_{name}_total counter")
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                if counter_name == name:
+                    lines.append(f"fvr_{name}_total{_format_labels(labels)} {value}")
+
+        if self.scenarios:
+            lines.append("# TYPE fvr_scenario_stage_seconds gauge")
+            for scenario, stages in self.scenarios.items():
+                for stage, seconds in sorted(stages.items()):
+                    labels = (("scenario", scenario), ("stage", stage))
+                    lines.append(f"fvr_scenario_stage_seconds{_format_labels(labels)} {seconds!r}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, prefix):
+        """同时导出 prefix.json 与 prefix.prom"""
+        self.to_json(prefix + ".json")
+        with open(prefix + ".prom", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+
+class _ScenarioScope:
+    __slots__ = ('metrics', 'label', 'previous')
+
+    def __init__(self, metrics, label):
+        self.metrics = metrics
+        self.label = label
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = self.metrics._scenario
+        self.metrics._scenario = self.label
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._scenario = self.previous
+        return False
+
+
+# 全局指标实例，各模块共用
+metrics = Metrics()
+
+# spawn 方式启动的工作进程会重新导入本模块，只在主进程中导出，避免覆盖主进程的结果
+if os.environ.get("FVR_METRICS") and multiprocessing.parent_process() is None:
+    metrics.enable()
+    atexit.register(metrics.export, os.environ["FVR_METRICS"])
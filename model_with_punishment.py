@@ -10,12 +10,19 @@ Description: 考虑四叶草等加成，并考虑失败降级惩罚情况下的
 
 import os
 import json
+import argparse
 import random
 import numpy as np
-from tqdm import tqdm
 
-from generate_combinations import generate_combinations
-from strategy_builder import StrategyBuilder
+from enhancement_engine import scenario_multipliers, scenario_result, format_strategy
+from parallel_sweep import solve_enhancement_parallel, default_workers
+from result_store import save_store, sweep_to_array
+from pareto_frontier import pareto_frontiers
+from coupled_solver import solve_coupled
+from punishment_simulation import PunishmentSimulator, BASE_CARD_VALUES, SUCCESS_RATES
+from result_cache import ResultCache, DEFAULT_DIRECTORY, canonical
+from instrumentation import metrics
+from tracing import tracer, TRACE_STAR
 
 # 原始成功率表
 p_list = [
@@ -34,10 +41,6 @@ VIP_additions = [0]*4 + [0.04, 0.05, 0.07, 0.08, 0.09, 0.11, 0.13, 0.15, 0.17, 0
 guild_additions = [0, 0.01, 0.03, 0.05, 0.08, 0.12, 0.16]
 
 STAR_LIMIT = 16
-# (同星副卡数, 低一星副卡数) 
-combinations_2 = generate_combinations(dim=2, max_total=3, exclude_zero=True)
-# (同星副卡数, 低一星副卡数, 低二星副卡数) 
-combinations_3 = generate_combinations(dim=3, max_total=3, exclude_zero=True)
 
 # 失败降级惩罚配置
 # 当主卡星级 >= 6 时，失败会降级
@@ -56,25 +59,45 @@ downgrade_levels = {
 }
 
 # 从预先计算的模拟结果中加载惩罚因子
-def load_punishment_factors():
+def load_punishment_factors(cache_dir=DEFAULT_DIRECTORY):
     """
     从预先计算的模拟结果中加载惩罚因子
     
+    结果文件记录了产生它的模拟输入（卡片价值、成功率、降级表与最大星级），
+    与当前配置不一致时不使用该文件；未记录输入的旧文件照常使用并给出提示。
+    文件不存在或输入不一致时用马尔可夫链精确求解，结果按输入缓存
+    
+    Args:
+        cache_dir: 结果缓存目录，None 表示不使用缓存
+    
     Returns:
         惩罚因子字典 {星级: 惩罚因子}
     """
+    simulator = PunishmentSimulator(
+        base_card_values=BASE_CARD_VALUES,
+        success_rates=SUCCESS_RATES,
+        downgrade_levels=downgrade_levels
+    )
+    path = os.path.join("outputjson", "punishment_simulation", "punishment_simulation_results.json")
     try:
-        with open(os.path.join("outputjson", "punishment_simulation", "punishment_simulation_results.json"), "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             results = json.load(f)
-            return {int(k): v for k, v in results["punishment_factors"].items()}
     except FileNotFoundError:
-        # 如果文件不存在，返回默认惩罚因子
-        return {
-            1: 1.0, 2: 1.0, 3: 1.0, 4: 1.0, 5: 1.0, 6: 1.0,
-            7: 0.597, 8: 0.447, 9: 0.364, 10: 0.231,
-            11: 0.218, 12: 0.206, 13: 0.193, 14: 0.182,
-            15: 0.172, 16: 0.161
-        }
+        print(f"未找到 {path}，使用马尔可夫链精确求解的惩罚因子")
+    else:
+        recorded = results.get("inputs")
+        if recorded is None:
+            print(f"{path} 未记录模拟输入，无法确认与当前配置一致")
+            return {int(k): v for k, v in results["punishment_factors"].items()}
+        configuration = canonical(simulator.configuration())
+        if (all(recorded.get(name) == value for name, value in configuration.items())
+                and recorded.get("max_star", 0) >= STAR_LIMIT):
+            return {int(k): v for k, v in results["punishment_factors"].items()}
+        print(f"{path} 的模拟输入与当前配置不一致，使用马尔可夫链精确求解的惩罚因子")
+    
+    return simulator.calculate_punishment_factors(
+        max_star=STAR_LIMIT, method="markov",
+        cache=None if cache_dir is None else ResultCache(cache_dir))
 
 def calculate_expected_cost(current_star, target_star, success_rate, card_value, punishment_factors):
     """
@@ -112,205 +135,168 @@ def calculate_expected_cost(current_star, target_star, success_rate, card_value,
     else:
         return theoretical_cost
 
-def main():
-    # 加载惩罚因子
-    punishment_factors = load_punishment_factors()
-    print("Loaded punishment factors:", punishment_factors)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="考虑失败降级惩罚的卡片强化最优决策模型")
+    parser.add_argument("--workers", type=int, default=1, help="并行求解场景的进程数，默认单进程，0 表示使用全部 CPU 核")
+    parser.add_argument("--output-format", choices=["json", "binary", "both"], default="json",
+                        help="输出格式：每个场景一个 JSON 文件，或所有场景一个列式二进制文件")
+    parser.add_argument("--solver", choices=["punishment", "mdp", "coupled"], default="punishment",
+                        help="punishment 按惩罚因子修正的性价比选择策略；mdp 直接最小化失败降级下的期望总成本，"
+                             "结果输出到 model_with_mdp；coupled 用各场景自己的卡片价值与成功率迭代计算惩罚因子"
+                             "直至自洽（单进程，不使用结果缓存），结果输出到 model_with_coupled")
+    parser.add_argument("--max-total", type=int, default=3, help="每次强化最多使用的副卡数")
+    parser.add_argument("--search", choices=["exhaustive", "pruned"], default="exhaustive",
+                        help="exhaustive 对所有候选求值；pruned 跳过被支配的组合与不可能胜出的四叶草，"
+                             "结果与穷举相同，副卡数较大时更快")
+    parser.add_argument("--pareto", action="store_true",
+                        help="同时计算各场景各星级候选策略的帕累托前沿（期望成本、成功概率、成本方差），"
+                             "保存为 .pareto.npz")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="将求解过程写为 NDJSON 跟踪记录（以 .gz 结尾时压缩），各场景策略不再打印到终端")
+    parser.add_argument("--trace-level", choices=["star", "candidate"], default="star",
+                        help="star 每个星级一条记录；candidate 另记录每个候选")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY,
+                        help="结果缓存目录，相同输入与代码版本的求解结果直接复用")
+    parser.add_argument("--no-cache", action="store_true", help="不读写结果缓存")
+    parser.add_argument("--metrics", metavar="PREFIX",
+                        help="开启计时与计数，结束时导出 PREFIX.json 与 PREFIX.prom")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    if args.trace:
+        tracer.open(args.trace, args.trace_level)
+    
+    try:
+        run(args)
+    finally:
+        if args.trace:
+            tracer.close()
+            print(f"跟踪记录已保存到 {args.trace}")
+        if args.metrics:
+            metrics.export(args.metrics)
+            print(f"指标已导出到 {args.metrics}.json 与 {args.metrics}.prom")
+
+
+def run(args):
+    """求解所有场景并按 args.output_format 输出结果"""
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.solver == "mdp":
+        model_name = "model_with_mdp"
+        punishment_factors = None
+    else:
+        model_name = "model_with_" + args.solver
+        # 加载惩罚因子（耦合求解时作为迭代的初值）
+        punishment_factors = load_punishment_factors(cache_dir)
+        print("Loaded punishment factors:", punishment_factors)
+    
+    if args.solver == "coupled":
+        with metrics.timer("coupled_solve"):
+            sweep, factors, history = solve_coupled(
+                p_list, clover_additions, Vclovers, scenario_multipliers(VIP_additions, guild_additions),
+                punishment_factors, downgrade_levels, STAR_LIMIT, args.max_total, search=args.search)
+        # 之后的帕累托前沿使用各场景自洽的惩罚因子
+        punishment_factors = {i: factors[..., i] for i in range(1, STAR_LIMIT + 1)}
+        coupling_path = os.path.join("e:\\FoodVsRats-CardEnhanceModel", "outputjson", model_name + ".coupling.json")
+        os.makedirs(os.path.dirname(coupling_path), exist_ok=True)
+        with open(coupling_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "惩罚因子": {f"VIP{vip}_公会{guild}": {str(i): factors[vip, guild, i] for i in range(7, STAR_LIMIT + 1)}
+                         for vip in range(len(VIP_additions)) for guild in range(len(guild_additions))},
+                "迭代记录": history
+            }, f, ensure_ascii=False, indent=4)
+        print(f"惩罚因子与迭代记录已保存到 {coupling_path}")
+    else:
+        # 计算所有星级卡片的价值（统一处理，根据星级决定是否应用惩罚因子）
+        # 所有 VIP × 公会场景作为数组维度一次性求解
+        with metrics.timer("dp_sweep"):
+            sweep = solve_enhancement_parallel(
+                p_list,
+                clover_additions=clover_additions,
+                Vclovers=Vclovers,
+                multipliers=scenario_multipliers(VIP_additions, guild_additions),
+                punishment_factors=punishment_factors,
+                star_limit=STAR_LIMIT,
+                max_total=args.max_total,
+                workers=args.workers or default_workers(),
+                downgrade_levels=downgrade_levels if args.solver == "mdp" else None,
+                search=args.search,
+                cache=None if cache_dir is None else ResultCache(cache_dir)
+            )
+    
+    if args.pareto:
+        with metrics.timer("pareto_frontier"):
+            frontiers = pareto_frontiers(
+                sweep, p_list, clover_additions, Vclovers,
+                scenario_multipliers(VIP_additions, guild_additions),
+                punishment_factors=punishment_factors, max_total=args.max_total,
+                downgrade_levels=downgrade_levels if args.solver == "mdp" else None)
+        pareto_path = os.path.join("e:\\FoodVsRats-CardEnhanceModel", "outputjson", model_name + ".pareto.npz")
+        os.makedirs(os.path.dirname(pareto_path), exist_ok=True)
+        frontiers.save(pareto_path)
+        print(f"帕累托前沿已保存到 {pareto_path}")
+
+    if args.output_format in ("binary", "both"):
+        store_path = os.path.join("e:\\FoodVsRats-CardEnhanceModel", "outputjson", model_name + ".fvr")
+        with metrics.timer("binary_write"):
+            save_store(store_path, sweep_to_array(sweep), model=model_name)
+        print(f"结果已保存到 {store_path}")
+    if args.output_format == "binary":
+        return
     
     # 处理所有VIP等级和公会等级的情况
     for cur_vip in range(len(VIP_additions)):
         for cur_guild in range(len(guild_additions)):
-            print(f"Processing VIP level: {cur_vip}, Guild level: {cur_guild}")
-            
-            # 存储各星级卡片的累计价值（基础价值+所有强化成本的总和）
-            Vcard_mins = [1e9] * (STAR_LIMIT + 1)
-            # 存储各星级卡片的强化成本（从上一星级强化到当前星级的成本）
-            cost_mins = [float('inf')] * (STAR_LIMIT + 1)
-            # 存储各星级卡片的最佳性价比（成功率/成本）- 用于选择最优策略
-            best_cost_effectiveness = [0] * (STAR_LIMIT + 1)
-            Vcard_mins[0] = 1
-            best_strategy = [""] * (STAR_LIMIT + 1)
-            best_strategy[1:STAR_LIMIT + 1] = p_list[0][1:STAR_LIMIT + 1]
-            
-            # 计算所有星级卡片的价值（统一处理，根据星级决定是否应用惩罚因子）
+            with metrics.scenario(f"VIP{cur_vip}_公会{cur_guild}"):
+                write_scenario(sweep, cur_vip, cur_guild, model_name)
+
+
+def write_scenario(sweep, cur_vip, cur_guild, model_name="model_with_punishment"):
+    """格式化单个 VIP × 公会场景的最优策略并写入 JSON 文件"""
+    if tracer.level < TRACE_STAR:
+        print(f"Processing VIP level: {cur_vip}, Guild level: {cur_guild}")
+    
+    with metrics.timer("strategy_format"):
+        result = scenario_result(sweep, (cur_vip, cur_guild))
+        # 存储各星级卡片的累计价值（基础价值+所有强化成本的总和）
+        Vcard_mins = result["Vcard_mins"].tolist()
+        # 存储各星级卡片的强化成本（从上一星级强化到当前星级的成本）
+        cost_mins = result["cost_mins"].tolist()
+        # 存储各星级卡片的最佳性价比（成功率/成本）- 用于选择最优策略
+        best_cost_effectiveness = result["cost_effectiveness"].tolist()
+        best_strategy = [""] * (STAR_LIMIT + 1)
+        for i in range(1, STAR_LIMIT + 1):
+            best_strategy[i] = p_list[0][i] + format_strategy(result, i, clover_levels)
+    
+    with metrics.timer("console_output"):
+        if tracer.level >= TRACE_STAR:
+            tracer.emit("scenario", vip=cur_vip, guild=cur_guild, strategies=best_strategy[1:])
+        else:
             for i in range(1, STAR_LIMIT + 1):
-                print(f"Processing star level {i}...")
-                
-                if i == 1:
-                    p3 = p_list[3][i]
-                    cost_mins[i] = Vcard_mins[0] / p3
-                    Vcard_mins[i] = Vcard_mins[0] + cost_mins[i]
-                    strategy = StrategyBuilder()
-                    
-                    strategy.add_card(i-1)
-                    strategy.set_probability(p3)
-                    sub_best_strategy = strategy.build()
-                
-                elif i == 2:
-                    p3 = p_list[3][i]
-                    p2 = p_list[2][i]
-                    sub_best_strategy = ""
-                    
-                    for comb in combinations_2:
-                        cur_cost = 0
-                        cur_p = 0
-                        strategy = StrategyBuilder()
-                        for j in range(0, len(comb)):
-                            if comb[j] == 'same':
-                                if j == 0:  # 第一张卡
-                                    cur_p = p3
-                                else:
-                                    cur_p = min(cur_p + p3/3, 1)
-                                strategy.add_card(i-1)
-                                cur_cost += Vcard_mins[i-1]
-                            elif comb[j] == 'down1':
-                                if j == 0:  # 第一张卡
-                                    cur_p = p2
-                                else:
-                                    cur_p = min(cur_p + p2/3, 1)
-                                strategy.add_card(i-2)
-                                cur_cost += Vcard_mins[i-2]
-                        without_addition_cost = cur_cost
-                        without_addition_p = cur_p
-                        # 计算加成后的概率
-                        for k in range(0, len(clover_levels)):
-                            # 计算加成后的概率
-                            cur_p = without_addition_p*clover_additions[k]*(1 + guild_additions[cur_guild] + VIP_additions[cur_vip])
-                            if cur_p > 1:
-                                cur_p = 1
-                                
-                            cur_cost = without_addition_cost
-                            cur_cost += Vclovers[k]
-                            
-                            # 计算期望成本
-                            # 注意：我们传递的是原始材料成本(cur_cost)，而不是除以成功率的成本
-                            # 惩罚因子会在calculate_expected_cost函数中应用
-                            # 这种方法的好处是：
-                            # 1. 更准确地反映实际成本（惩罚因子已经考虑了失败和降级）
-                            # 2. 避免在高成功率情况下的成本低估
-                            # 3. 更清晰地分离关注点（原始成本与惩罚因素）
-                            expected_cost = calculate_expected_cost(
-                                current_star=i-1,
-                                target_star=i,
-                                success_rate=cur_p,
-                                card_value=cur_cost,
-                                punishment_factors=punishment_factors
-                            )
-                            
-                            # 计算性价比指标：成功率/成本
-                            # 性价比与最低成本不同：最低成本只考虑成本最小，而性价比同时考虑成功率和成本的平衡
-                            # 性价比高的策略可能不是成本最低的，但是在成功率和成本之间取得了最佳平衡
-                            if expected_cost > 0:
-                                cost_effectiveness = cur_p / expected_cost
-                            else:
-                                # 避免除以零
-                                cost_effectiveness = 0
-                            
-                            # 使用性价比作为选择标准，而不是仅仅使用最低成本
-                            if cost_effectiveness > best_cost_effectiveness[i]:
-                                strategy.use_clover(clover_levels[k])
-                                strategy.set_probability(cur_p)
-                                sub_best_strategy = strategy.build()
-                                best_cost_effectiveness[i] = cost_effectiveness
-                                # 仍然计算总成本以便后续使用
-                                cost_mins[i] = expected_cost
-                                Vcard_mins[i] = Vcard_mins[i-1] + cost_mins[i]
-                else:
-                    p3 = p_list[3][i]
-                    p2 = p_list[2][i]
-                    p1 = p_list[1][i]
-                    sub_best_strategy = ""
-                    
-                    # 对于高星级，使用进度条显示
-                    if i >= 7:
-                        combinations_iterator = tqdm(combinations_3, desc=f"Combinations for {i}-star")
-                    else:
-                        combinations_iterator = combinations_3
-                    
-                    for comb in combinations_iterator:
-                        cur_cost = 0
-                        cur_p = 0
-                        strategy = StrategyBuilder()
-                        for j in range(0, len(comb)):
-                            if comb[j] == 'same':
-                                if j == 0:  # 第一张卡
-                                    cur_p = p3
-                                else:
-                                    cur_p = min(cur_p + p3/3, 1)
-                                strategy.add_card(i-1)
-                                cur_cost += Vcard_mins[i-1]
-                            elif comb[j] == 'down1':
-                                if j == 0:  # 第一张卡
-                                    cur_p = p2
-                                else:
-                                    cur_p = min(cur_p + p2/3, 1)
-                                strategy.add_card(i-2)
-                                cur_cost += Vcard_mins[i-2]
-                            elif comb[j] == 'down2':
-                                if j == 0:  # 第一张卡
-                                    cur_p = p1
-                                else:
-                                    cur_p = min(cur_p + p1/3, 1)
-                                strategy.add_card(i-3)
-                                cur_cost += Vcard_mins[i-3]
-                        without_addition_cost = cur_cost
-                        without_addition_p = cur_p
-                        # 计算加成后的概率
-                        for k in range(len(clover_levels)):
-                            # 计算加成后的概率
-                            cur_p = without_addition_p*clover_additions[k]*(1 + guild_additions[cur_guild] + VIP_additions[cur_vip])
-                            if cur_p > 1:
-                                cur_p = 1
-                                
-                            cur_cost = without_addition_cost
-                            cur_cost += Vclovers[k]
-                            
-                            # 计算期望成本，考虑惩罚因子
-                            expected_cost = calculate_expected_cost(
-                                current_star=i-1,
-                                target_star=i,
-                                success_rate=cur_p,
-                                card_value=cur_cost,
-                                punishment_factors=punishment_factors
-                            )
-                            
-                            # 计算性价比指标
-                            cost_effectiveness = cur_p / expected_cost if expected_cost > 0 else 0
-                            
-                            # 使用性价比作为选择标准
-                            if cost_effectiveness > best_cost_effectiveness[i]:
-                                strategy.use_clover(clover_levels[k])
-                                strategy.set_probability(cur_p)
-                                sub_best_strategy = strategy.build()
-                                best_cost_effectiveness[i] = cost_effectiveness
-                                # 仍然计算总成本以便后续使用
-                                cost_mins[i] = expected_cost
-                                Vcard_mins[i] = Vcard_mins[i-1] + cost_mins[i]
-                
-                best_strategy[i] += sub_best_strategy
                 print(best_strategy[i])
-            
-            # 构建输出数据结构
-            data = {
-                "当前VIP等级": cur_vip,
-                "当前公会等级": cur_guild,
-                "最佳策略": {str(i): best_strategy[i] for i in range(1, STAR_LIMIT + 1)},
-                "单张卡片的价值": {
-                    str(i): {
-                        "价值": Vcard_mins[i],  # 卡片的累计价值（基础价值+所有强化成本）
-                        "成本": cost_mins[i],   # 强化成本（从上一星级强化到当前星级）
-                        "性价比": best_cost_effectiveness[i]  # 最佳策略的性价比（成功率/成本）
-                    } 
-                    for i in range(1, STAR_LIMIT + 1)
-                }
-            }
-            
-            output_dir = os.path.join("e:\\FoodVsRats-CardEnhanceModel", "outputjson", "model_with_punishment")
-            os.makedirs(output_dir, exist_ok=True)
-            filename = f"VIP等级：{cur_vip}  公会等级：{cur_guild}.json"
-            with open(os.path.join(output_dir, filename), "w", encoding="utf-8") as f:
-                # 保存到 JSON 文件
-                json.dump(data, f, ensure_ascii=False, indent=4)  # 确保中文不乱码，格式化输出
+    
+    # 构建输出数据结构
+    data = {
+        "当前VIP等级": cur_vip,
+        "当前公会等级": cur_guild,
+        "最佳策略": {str(i): best_strategy[i] for i in range(1, STAR_LIMIT + 1)},
+        "单张卡片的价值": {
+            str(i): {
+                "价值": Vcard_mins[i],  # 卡片的累计价值（基础价值+所有强化成本）
+                "成本": cost_mins[i],   # 强化成本（从上一星级强化到当前星级）
+                "性价比": best_cost_effectiveness[i]  # 最佳策略的性价比（成功率/成本）
+            } 
+            for i in range(1, STAR_LIMIT + 1)
+        }
+    }
+    
+    output_dir = os.path.join("e:\\FoodVsRats-CardEnhanceModel", "outputjson", model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    filename = f"VIP等级：{cur_vip}  公会等级：{cur_guild}.json"
+    with metrics.timer("json_write"):
+        with open(os.path.join(output_dir, filename), "w", encoding="utf-8") as f:
+            # 保存到 JSON 文件
+            json.dump(data, f, ensure_ascii=False, indent=4)  # 确保中文不乱码，格式化输出
+            metrics.count("bytes_written", f.tell())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
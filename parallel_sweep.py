@@ -0,0 +1,165 @@
+"""
+Author: HPC2H2
+Date: 2025-08-12
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 多进程并行执行场景扫描。
+             将场景分片后交给进程池求解，共享的只读表格在进程初始化时只发送一次，
+             结果按场景顺序合并，输出与单进程完全一致。
+             按场景给出的四叶草价值与惩罚因子与加成倍数按相同的边界切分，随各自的分片发送。
+             开启跟踪时工作进程在内存中收集记录，随分片结果交回主进程，按分片顺序写出；
+             开启指标时工作进程的计时与计数同样随分片结果交回，合并到主进程的指标中。
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import enhancement_engine
+import generate_combinations
+from enhancement_engine import solve_enhancement_sweep, STAR_LIMIT
+from result_cache import code_version
+from tracing import tracer, TRACE_OFF, TRACE_STAR
+from instrumentation import metrics
+
+# 工作进程内的共享只读参数，由 _init_worker 在进程启动时填充
+_shared_tables = {}
+
+
+def _init_worker(tables, trace_level=TRACE_OFF, metrics_enabled=False):
+    """进程池初始化函数：每个工作进程只接收一次共享表格"""
+    # 跟踪记录只由主进程写出，工作进程丢弃继承来的输出，改为在内存中收集
+    tracer.capture(trace_level)
+    # fork 出的工作进程继承了主进程已收集的指标，清空后只收集本进程的部分
+    metrics.reset()
+    metrics.enable(metrics_enabled)
+    _shared_tables.update(tables)
+
+
+def _solve_shard(shard):
+    """
+    在工作进程中求解一个场景分片
+
+    Args:
+        shard: 分片自己的参数，至少含 multipliers，按场景给出的 Vclovers 与 punishment_factors 也随分片发送
+
+    Returns:
+        (求解结果, 墙钟时间, CPU 时间, 跟踪记录, 指标)
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = solve_enhancement_sweep(**{**_shared_tables, **shard})
+    return (result, time.perf_counter() - wall_start, time.process_time() - cpu_start, tracer.collect(),
+            metrics.snapshot(reset=True))
+
+
+def solve_enhancement_parallel(p_list, clover_additions=(1,), Vclovers=(0,), multipliers=1,
+                               punishment_factors=None, star_limit=STAR_LIMIT, max_total=3,
+                               workers=1, shards_per_worker=4, downgrade_levels=None, search="exhaustive",
+                               cache=None):
+    """
+    使用进程池并行求解一组加成场景，参数与返回值同 solve_enhancement_sweep
+
+    Args:
+        workers: 工作进程数，<= 1 时直接在当前进程求解
+        shards_per_worker: 每个工作进程平均分到的分片数，用于负载均衡
+        cache: ResultCache，给定时按全部输入与求解代码的版本缓存结果，命中时数组为只读内存映射。
+               search 与进程数不影响结果，不计入缓存键；开启跟踪时总是重新求解，以写出完整的记录
+
+    Returns:
+        与 solve_enhancement_sweep 相同的字典，场景顺序与 multipliers 一致
+    """
+    if cache is not None:
+        inputs = {
+            "p_list": p_list,
+            "clover_additions": clover_additions,
+            "Vclovers": Vclovers,
+            "multipliers": np.asarray(multipliers, dtype=float),
+            "punishment_factors": punishment_factors,
+            "star_limit": star_limit,
+            "max_total": max_total,
+            "downgrade_levels": downgrade_levels
+        }
+        code = code_version(enhancement_engine, generate_combinations)
+
+        def compute():
+            return solve_enhancement_parallel(p_list, clover_additions, Vclovers, multipliers, punishment_factors,
+                                              star_limit, max_total, workers, shards_per_worker,
+                                              downgrade_levels, search)
+
+        if tracer.level >= TRACE_STAR:
+            result = compute()
+            cache.put(cache.key("enhancement_sweep", inputs, code), result, "enhancement_sweep", inputs)
+            return result
+        result, _ = cache.get_or_compute("enhancement_sweep", inputs, compute, code)
+        return result
+
+    tables = {
+        "p_list": p_list,
+        "clover_additions": clover_additions,
+        "Vclovers": Vclovers,
+        "punishment_factors": punishment_factors,
+        "star_limit": star_limit,
+        "max_total": max_total,
+        "downgrade_levels": downgrade_levels,
+        "search": search
+    }
+    if workers <= 1:
+        return solve_enhancement_sweep(multipliers=multipliers, **tables)
+
+    shape = np.shape(multipliers)
+    flat = np.asarray(multipliers, dtype=float).reshape(-1)
+    pieces = [piece for piece in np.array_split(np.arange(flat.size), workers * shards_per_worker) if piece.size]
+    shards = [{"multipliers": flat[piece]} for piece in pieces]
+
+    # 带场景维度的参数展平后按与 multipliers 相同的边界切分，只把各分片自己的部分发给工作进程
+    clover_values = np.asarray(Vclovers, dtype=float)[..., :len(clover_additions)]
+    if clover_values.ndim > 1:
+        clover_values = np.broadcast_to(clover_values, shape + clover_values.shape[-1:]).reshape(flat.size, -1)
+        del tables["Vclovers"]
+        for shard, piece in zip(shards, pieces):
+            shard["Vclovers"] = clover_values[piece]
+    if punishment_factors is not None and any(np.ndim(factor) for factor in punishment_factors.values()):
+        flat_factors = {star: np.broadcast_to(np.asarray(factor, dtype=float), shape).reshape(-1)
+                        if np.ndim(factor) else factor for star, factor in punishment_factors.items()}
+        del tables["punishment_factors"]
+        for shard, piece in zip(shards, pieces):
+            shard["punishment_factors"] = {star: factor[piece] if np.ndim(factor) else factor
+                                           for star, factor in flat_factors.items()}
+
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(tables, tracer.level, metrics.enabled)) as executor:
+        # map 按提交顺序返回结果，保证输出顺序确定
+        outputs = list(executor.map(_solve_shard, shards))
+    wall_time = time.perf_counter() - wall_start
+
+    # 记录中的场景按分片内的展平顺序排列，offset 为分片第一个场景的全局下标
+    offset = 0
+    for index, (piece, output) in enumerate(zip(pieces, outputs)):
+        for record in output[3]:
+            tracer.emit(record.pop("event"), shard=index, offset=offset, **record)
+        metrics.merge(output[4])
+        offset += piece.size
+
+    task_wall = sum(output[1] for output in outputs)
+    task_cpu = sum(output[2] for output in outputs)
+    efficiency = task_wall / (workers * wall_time) if wall_time > 0 else 0
+    cpu_ratio = task_cpu / task_wall if task_wall > 0 else 0
+    print(f"并行求解 {flat.size} 个场景：{workers} 个进程，{len(shards)} 个分片，"
+          f"耗时 {wall_time:.3f}s，并行效率 {efficiency:.1%}，"
+          f"任务 CPU 占比 {cpu_ratio:.1%}（接近 100% 为 CPU 密集，明显偏低为 I/O 等待）")
+
+    return {
+        key: np.concatenate([output[0][key] for output in outputs]).reshape(
+            shape + outputs[0][0][key].shape[1:])
+        for key in outputs[0][0]
+    }
+
+
+def default_workers():
+    """默认工作进程数：可用 CPU 核数"""
+    return os.cpu_count() or 1
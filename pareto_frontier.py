@@ -0,0 +1,201 @@
+"""
+Author: HPC2H2
+Date: 2025-08-30
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 各场景各星级候选策略的帕累托前沿。
+             动态规划每个星级只保留一个最优策略；本模块在求解结果的卡片价值下，
+             对同一批（卡片组合 × 四叶草等级）候选按（期望成本, 成功概率, 成本方差）
+             求非支配集，给出更稳或更省的备选策略。
+             前沿以压缩行格式（偏移 + 按期望成本排序的点）保存，与最佳策略一同输出，
+             查询时直接切片，无需重新求解。
+"""
+
+import numpy as np
+
+from enhancement_engine import star_tables, combination_costs, candidate_scores, star_factor
+from strategy_builder import StrategyRecord, CLOVER_LEVELS, engine_probability
+
+FIELDS = ("card_counts", "clover_indices", "probabilities", "expected_costs", "variances")
+
+
+def skyline(costs, probabilities, variances):
+    """
+    对每一行候选求（成本最小, 成功概率最大, 方差最小）的非支配集
+
+    先按（成本升序, 成功概率降序, 方差升序, 下标）排序，剩余候选中排在最前的一个
+    不可能被其他剩余候选支配，必在前沿上；取出后删去它支配的所有候选，重复至候选取完。
+    每轮对所有行同时处理，轮数等于最大前沿点数。完全相同的点只保留最先出现的一个。
+
+    Args:
+        costs: 期望成本 (n_rows, n)
+        probabilities: 成功概率 (n_rows, n)
+        variances: 成本方差 (n_rows, n)
+
+    Returns:
+        (order, frontier)：order 为各行的排序下标 (n_rows, n)，
+        frontier[r, j] 表示 order[r, j] 号候选在前沿上，因此各行前沿点已按期望成本排序
+    """
+    order = np.lexsort((variances, -probabilities, costs), axis=-1)
+    costs, probabilities, variances = (np.take_along_axis(a, order, axis=-1)
+                                       for a in (costs, probabilities, variances))
+    remaining = np.ones(costs.shape, dtype=bool)
+    frontier = np.zeros(costs.shape, dtype=bool)
+    rows = np.arange(len(costs))
+    while True:
+        active = rows[remaining.any(axis=1)]
+        if not active.size:
+            break
+        first = np.argmax(remaining[active], axis=1)
+        frontier[active, first] = True
+        dominated = ((costs[active] >= costs[active, first][:, None])
+                     & (probabilities[active] <= probabilities[active, first][:, None])
+                     & (variances[active] >= variances[active, first][:, None]))
+        remaining[active] &= ~dominated
+    return order, frontier
+
+
+class ParetoTable:
+    """压缩行格式的帕累托前沿表，按 (场景下标, 星级) 查询"""
+
+    def __init__(self, shape, offsets, card_counts, clover_indices, probabilities, expected_costs, variances):
+        """
+        Args:
+            shape: 场景形状 + (star_limit + 1,)
+            offsets: 各 (场景, 星级) 前沿点在数据数组中的起止位置 (prod(shape) + 1,)
+            其余: 所有前沿点的副卡数量 (N, 3)、四叶草等级下标、成功概率、期望成本与成本方差
+        """
+        self.shape = tuple(shape)
+        self.offsets = offsets
+        self.card_counts = card_counts
+        self.clover_indices = clover_indices
+        self.probabilities = probabilities
+        self.expected_costs = expected_costs
+        self.variances = variances
+
+    def frontier(self, index, star):
+        """
+        取出单个场景单个星级的前沿
+
+        Args:
+            index: 场景下标，例如 (cur_vip, cur_guild)
+            star: 目标星级
+
+        Returns:
+            字典，各项为按期望成本升序排列的数组，键见 FIELDS
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        cell = np.ravel_multi_index(index + (star,), self.shape)
+        start, stop = self.offsets[cell], self.offsets[cell + 1]
+        return {field: getattr(self, field)[start:stop] for field in FIELDS}
+
+    def lookup(self, index, star, clover_levels=CLOVER_LEVELS):
+        """
+        以可 JSON 序列化的形式查询前沿，用于展示或查询服务
+
+        Returns:
+            [{"策略": 策略字符串, "成功概率": ..., "期望成本": ..., "成本方差": ...}, ...]
+        """
+        points = self.frontier(index, star)
+        entries = []
+        for counts, clover, p, cost, variance in zip(*(points[field].tolist() for field in FIELDS)):
+            cards = []
+            for t, count in enumerate(counts):
+                cards += [star - 1 - t] * count
+            entries.append({
+                "策略": StrategyRecord(cards, clover, engine_probability(p), cost).format(clover_levels),
+                "成功概率": p,
+                "期望成本": cost,
+                "成本方差": variance
+            })
+        return entries
+
+    def save(self, path):
+        """保存为 .npz 文件"""
+        np.savez(path, shape=np.array(self.shape), offsets=self.offsets,
+                 **{field: getattr(self, field) for field in FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        """载入 save 保存的文件"""
+        with np.load(path) as data:
+            return cls(tuple(data["shape"].tolist()), data["offsets"], *(data[field] for field in FIELDS))
+
+
+def pareto_frontiers(result, p_list, clover_additions=(1,), Vclovers=(0,), multipliers=1,
+                     punishment_factors=None, max_total=3, downgrade_levels=None):
+    """
+    在 solve_enhancement_sweep 的求解结果上计算各场景各星级的帕累托前沿
+
+    候选与求解时完全相同，副卡价值取结果中的卡片价值，因此求解选出的最佳策略
+    （或与其等价的点）必在前沿上。第 i 星候选的成本方差按失败后重复尝试计算：
+    每次尝试消耗材料 m，失败降级时另需重新强化的成本 R（取低星级卡片价值，视为常数），
+    尝试次数服从几何分布，方差为 (m + R)^2 (1 - p) / p^2；惩罚模型的期望成本乘以惩罚因子，
+    方差相应乘以惩罚因子的平方。
+
+    Args:
+        result: solve_enhancement_sweep 的返回值
+        其余参数: 与求解时相同，见 solve_enhancement_sweep
+
+    Returns:
+        ParetoTable
+    """
+    clover_additions = np.asarray(clover_additions, dtype=float)
+    Vclovers = np.asarray(Vclovers, dtype=float)[..., :len(clover_additions)]
+    shape = np.shape(multipliers)
+    multipliers = np.asarray(multipliers, dtype=float).reshape(-1)
+    n_scenarios = multipliers.size
+    Vclovers = np.broadcast_to(Vclovers, shape + Vclovers.shape[-1:]).reshape(n_scenarios, -1)
+    Vcard_mins = np.asarray(result["Vcard_mins"]).reshape(n_scenarios, -1)
+    star_limit = Vcard_mins.shape[1] - 1
+    tables = star_tables(p_list, star_limit, max_total)
+
+    # 各星级前沿点：(单元格编号, 副卡数量, 四叶草等级下标, 成功概率, 期望成本, 方差)
+    parts = []
+    scenarios = np.arange(n_scenarios)
+    # 0→1 只有一张 0 星卡一种候选
+    p1 = np.asarray(result["probabilities"]).reshape(n_scenarios, -1)[:, 1]
+    parts.append((scenarios * (star_limit + 1) + 1,
+                  np.tile([1, 0, 0], (n_scenarios, 1)),
+                  np.zeros(n_scenarios, dtype=np.int64),
+                  p1,
+                  np.asarray(result["cost_mins"]).reshape(n_scenarios, -1)[:, 1],
+                  Vcard_mins[:, 0] ** 2 * (1 - p1) / p1 ** 2))
+
+    for i in range(2, star_limit + 1):
+        counts, sequences, base_p = tables[i]
+        base_cost = combination_costs(sequences, Vcard_mins[:, [max(i - 1 - t, 0) for t in range(3)]])
+        recovery = None
+        if downgrade_levels and downgrade_levels.get(i - 1):
+            recovery = Vcard_mins[:, i-1] - Vcard_mins[:, max(i - 1 - downgrade_levels[i-1], 0)]
+        factor = star_factor(punishment_factors, i, n_scenarios)
+
+        cur_p, expected_cost, _ = candidate_scores(base_p, base_cost, clover_additions, Vclovers, multipliers,
+                                                   recovery, factor)
+        per_attempt = base_cost[:, :, None] + Vclovers[:, None, :]
+        if recovery is not None:
+            per_attempt = per_attempt + recovery[:, None, None]
+        variance = per_attempt ** 2 * (1 - cur_p) / cur_p ** 2
+        if factor is not None:
+            variance = variance * factor ** 2
+
+        cur_p, expected_cost, variance = (a.reshape(n_scenarios, -1) for a in (cur_p, expected_cost, variance))
+        order, frontier = skyline(expected_cost, cur_p, variance)
+        rows, positions = np.nonzero(frontier)
+        candidates = order[rows, positions]
+        comb, k = np.divmod(candidates, len(clover_additions))
+        parts.append((rows * (star_limit + 1) + i, counts[comb], k,
+                      cur_p[rows, candidates], expected_cost[rows, candidates], variance[rows, candidates]))
+
+    cells, card_counts, clover_indices, probabilities, expected_costs, variances = (
+        np.concatenate(columns) for columns in zip(*parts))
+    # 稳定排序保持单元格内按期望成本排列的顺序
+    sort = np.argsort(cells, kind="stable")
+    n_cells = n_scenarios * (star_limit + 1)
+    offsets = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=n_cells), out=offsets[1:])
+    return ParetoTable(shape + (star_limit + 1,), offsets,
+                       card_counts[sort].astype(np.int8), clover_indices[sort].astype(np.int8),
+                       probabilities[sort], expected_costs[sort], variances[sort])
@@ -9,10 +9,200 @@ Description: 美食大战老鼠卡片强化失败惩罚模拟工具
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 import json
 import os
+import sys
+import argparse
+from contextlib import contextmanager
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import metrics
+from result_cache import ResultCache, DEFAULT_DIRECTORY, canonical, code_version
+
+# 示例基础卡片价值（可以从之前的模型结果中加载）
+BASE_CARD_VALUES = {
+    0: 1,
+    1: 1,
+    2: 2,
+    3: 4,
+    4: 8,
+    5: 16,
+    6: 32,
+    7: 64,
+    8: 128,
+    9: 256,
+    10: 512,
+    11: 1024,
+    12: 2048,
+    13: 4096,
+    14: 8192,
+    15: 16384
+}
+
+# 成功率配置
+SUCCESS_RATES = {
+    1: 1.0,   # 0→1星
+    2: 1.0,   # 1→2星
+    3: 0.968, # 2→3星
+    4: 0.686, # 3→4星
+    5: 0.495, # 4→5星
+    6: 0.396, # 5→6星
+    7: 0.319, # 6→7星
+    8: 0.264, # 7→8星
+    9: 0.220, # 8→9星
+    10: 0.135, # 9→10星
+    11: 0.125, # 10→11星
+    12: 0.116, # 11→12星
+    13: 0.107, # 12→13星
+    14: 0.101, # 13→14星
+    15: 0.095, # 14→15星
+    16: 0.088  # 15→16星
+}
+
+# 降级等级配置
+DOWNGRADE_LEVELS = {
+    6: 1,   # 6→7星失败降到5星
+    7: 1,   # 7→8星失败降到6星
+    8: 1,   # 8→9星失败降到7星
+    9: 1,   # 9→10星失败降到8星
+    10: 1,  # 10→11星失败降到9星
+    11: 1,  # 11→12星失败降到10星
+    12: 1,  # 12→13星失败降到11星
+    13: 1,  # 13→14星失败降到12星
+    14: 1,  # 14→15星失败降到13星
+    15: 1   # 15→16星失败降到14星
+}
+
+# 带种子模拟时每块的轨迹数。块是随机数流的最小单位，
+# 第 target_star 星第 block 块的随机数流只由 (seed, target_star, block) 决定，与进程数无关
+SIMULATION_BLOCK_SIZE = 100000
+
+
+def _block_rng(seed, target_star, block):
+    """第 target_star 星第 block 块的独立随机数流"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(target_star, block)))
+
+
+def _block_sizes(num_simulations, block_size):
+    """将模拟次数切分为固定大小的块"""
+    return [min(block_size, num_simulations - start) for start in range(0, num_simulations, block_size)]
+
+
+# simulated_values 中按星级索引的项，从缓存的 JSON 读回时需还原整数键
+STAR_KEYED = ("theoretical_costs", "simulated_costs", "avg_attempts", "cost_variance", "precision")
+
+
+def _star_keys(values):
+    """将字典的星级键还原为整数"""
+    return {int(star): value for star, value in values.items()}
+
+
+# 工作进程内的模拟器，由 _init_worker 在进程启动时填充
+_worker_simulator = None
+
+
+def _init_worker(simulator, metrics_enabled=None):
+    """
+    进程池初始化函数：每个工作进程只接收一次模拟器配置
+
+    Args:
+        simulator: 模拟器
+        metrics_enabled: 工作进程是否收集指标，None 表示在当前进程中运行，不改变指标状态
+    """
+    global _worker_simulator
+    _worker_simulator = simulator
+    if metrics_enabled is not None:
+        # fork 出的工作进程继承了主进程已收集的指标，清空后只收集本进程的部分
+        metrics.reset()
+        metrics.enable(metrics_enabled)
+
+
+class RunningStats:
+    """
+    成本样本的流式均值与方差
+
+    按块合并 (样本数, 均值, 离差平方和)，使用 Chan 等人的并行合并公式，
+    不保存样本本身，数值上比累加平方和稳定
+    """
+    __slots__ = ('count', 'mean', 'm2', 'trajectories', 'attempts')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.trajectories = 0
+        self.attempts = 0
+
+    def add(self, count, mean, m2, trajectories=0, attempts=0):
+        """合并一块的统计量"""
+        if count:
+            total = self.count + count
+            delta = mean - self.mean
+            self.mean += delta * count / total
+            self.m2 += m2 + delta**2 * self.count * count / total
+            self.count = total
+        self.trajectories += trajectories
+        self.attempts += attempts
+
+    def add_samples(self, samples, trajectories=0, attempts=0):
+        """合并一块样本"""
+        mean = float(samples.mean()) if len(samples) else 0.0
+        self.add(len(samples), mean, float(((samples - mean)**2).sum()), trajectories, attempts)
+
+    @property
+    def standard_error(self):
+        """均值的标准误"""
+        if self.count < 2:
+            return float("inf")
+        return float(np.sqrt(self.m2 / (self.count - 1) / self.count))
+
+    def precision(self, z):
+        """置信区间半宽及其相对均值的比例"""
+        half_width = z * self.standard_error
+        return half_width, half_width / abs(self.mean) if self.mean else float("inf")
+
+
+def _simulate_block_task(task):
+    """在工作进程中模拟一块，返回 (样本数, 均值, 离差平方和, 轨迹数, 尝试次数)"""
+    current_star, target_star, seed, block, n, antithetic = task
+    costs, attempts = _worker_simulator.simulate_block(
+        current_star, target_star, n, _block_rng(seed, target_star, block), antithetic)
+    mean = float(costs.mean())
+    trajectories = 2 * len(costs) if antithetic else len(costs)
+    return len(costs), mean, float(((costs - mean)**2).sum()), trajectories, attempts
+
+
+def _simulate_block_worker(task):
+    """进程池中模拟一块，返回 (块统计量, 指标)，指标由主进程合并"""
+    return _simulate_block_task(task), metrics.snapshot(reset=True)
+
+
+def _merge_worker_outputs(outputs):
+    """合并工作进程交回的指标，返回各块统计量"""
+    stats = []
+    for block, snapshot in outputs:
+        metrics.merge(snapshot)
+        stats.append(block)
+    return stats
+
+
+@contextmanager
+def _block_pool(simulator, workers=1):
+    """
+    模拟块的执行器：返回 run(tasks) 函数，按提交顺序返回各块统计量
+
+    workers > 1 时在整个上下文内复用同一个进程池
+    """
+    if workers <= 1:
+        _init_worker(simulator)
+        yield lambda tasks: [_simulate_block_task(task) for task in tasks]
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(simulator, metrics.enabled)) as executor:
+        # map 按提交顺序返回结果，按块顺序合并保证与进程数无关
+        yield lambda tasks: _merge_worker_outputs(executor.map(_simulate_block_worker, tasks))
+
 
 class PunishmentSimulator:
     def __init__(self, base_card_values, success_rates, downgrade_levels):
@@ -32,7 +222,35 @@ class PunishmentSimulator:
         self.simulated_values = {}
         self.punishment_factors = {}
     
-    def simulate_enhancement(self, current_star, target_star, num_simulations=10000):
+    def configuration(self):
+        """模拟器的配置：卡片价值、成功率与降级表"""
+        return {
+            "base_card_values": self.base_card_values,
+            "success_rates": self.success_rates,
+            "downgrade_levels": self.downgrade_levels
+        }
+    
+    def simulation_inputs(self, max_star, num_simulations, method, seed=None, antithetic=False,
+                          target_precision=None, confidence=0.95, max_simulations=10000000):
+        """
+        决定惩罚因子计算结果的全部输入，参数同 calculate_punishment_factors
+        
+        只记录对所选方式有影响的参数：马尔可夫链与模拟次数无关，
+        seeded 模式的结果与进程数无关
+        
+        Returns:
+            规范形式的输入字典（键均为字符串），可与保存的结果直接比较
+        """
+        inputs = dict(self.configuration(), max_star=max_star, method=method)
+        if method != "markov":
+            inputs["num_simulations"] = num_simulations
+        if method == "seeded":
+            inputs.update(seed=seed, antithetic=antithetic, confidence=confidence)
+            if target_precision is not None:
+                inputs.update(target_precision=target_precision, max_simulations=max_simulations)
+        return canonical(inputs)
+    
+    def simulate_enhancement(self, current_star, target_star, num_simulations=10000, rng=None):
         """
         模拟从current_star强化到target_star的过程，考虑失败降级
         
@@ -40,6 +258,7 @@ class PunishmentSimulator:
             current_star: 当前星级
             target_star: 目标星级
             num_simulations: 模拟次数
+            rng: np.random.Generator，None 表示使用全局随机数状态
         
         Returns:
             期望成本
@@ -47,6 +266,7 @@ class PunishmentSimulator:
         if current_star >= target_star:
             return 0
         
+        random = np.random.random if rng is None else rng.random
         total_cost = 0
         attempts_count = 0
         
@@ -62,7 +282,7 @@ class PunishmentSimulator:
                 cost += attempt_cost
                 
                 # 检查强化是否成功
-                if np.random.random() < self.success_rates[current+1]:
+                if random() < self.success_rates[current+1]:
                     # 成功
                     current = target_star
                 else:
@@ -73,22 +293,342 @@ class PunishmentSimulator:
             total_cost += cost
             attempts_count += attempts
         
+        metrics.count("simulated_attempts", attempts_count, method="loop", star=target_star)
+        avg_cost = total_cost / num_simulations
+        avg_attempts = attempts_count / num_simulations
+        
+        return avg_cost, avg_attempts
+    
+    def _lookup_tables(self, target_star):
+        """
+        将字典形式的配置展开为按星级索引的数组，供向量化模拟使用
+        
+        Args:
+            target_star: 目标星级
+        
+        Returns:
+            (卡片价值数组, 成功率数组, 失败降级数数组)，下标均为主卡当前星级
+        """
+        values = np.zeros(target_star)
+        rates = np.zeros(target_star)
+        downs = np.zeros(target_star, dtype=np.int64)
+        for star in range(target_star):
+            values[star] = self.base_card_values[star]
+            rates[star] = self.success_rates[star+1]
+            # 与 simulate_enhancement 保持一致：星级>=5 且在降级表中才降级
+            if star >= 5 and star in self.downgrade_levels:
+                downs[star] = self.downgrade_levels[star]
+        return values, rates, downs
+    
+    def simulate_enhancement_vectorized(self, current_star, target_star, num_simulations=10000,
+                                        chunk_size=1000000, rng=None):
+        """
+        向量化版本的 simulate_enhancement
+        
+        所有模拟轨迹以数组形式同时推进，每一轮为所有仍未成功的轨迹成批抽取随机数，
+        成功的轨迹随即退出。模拟按 chunk_size 分块进行，内存占用与总模拟次数无关。
+        
+        Args:
+            current_star: 当前星级
+            target_star: 目标星级
+            num_simulations: 模拟次数
+            chunk_size: 每块同时推进的轨迹数
+            rng: np.random.Generator，None 表示使用全局随机数状态
+        
+        Returns:
+            (平均成本, 平均尝试次数)
+        """
+        if current_star >= target_star:
+            return 0
+        
+        random = np.random.random if rng is None else rng.random
+        values, rates, downs = self._lookup_tables(target_star)
+        
+        total_cost = 0.0
+        attempts_count = 0
+        remaining = num_simulations
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            remaining -= n
+            current = np.full(n, current_star, dtype=np.int64)
+            while current.size:
+                attempts_count += current.size
+                total_cost += float(values[current].sum())
+                
+                # 检查强化是否成功，成功的轨迹退出
+                failed = random(current.size) >= rates[current]
+                current = current[failed]
+                # 失败 - 按降级表降级
+                current = np.maximum(current - downs[current], 0)
+        
+        metrics.count("simulated_attempts", attempts_count, method="vectorized", star=target_star)
         avg_cost = total_cost / num_simulations
         avg_attempts = attempts_count / num_simulations
         
         return avg_cost, avg_attempts
     
-    def calculate_punishment_factors(self, max_star=16, num_simulations=10000):
+    def simulate_block(self, current_star, target_star, n, rng, antithetic=False):
+        """
+        模拟一块轨迹，返回每个独立样本的成本
+        
+        每一轮为整块抽取同样数量的随机数，第 t 条轨迹的第 r 次尝试总是使用第 r 轮的第 t 个随机数，
+        因此相同随机数流下不同配置的轨迹一一对应（公共随机数）。
+        antithetic=True 时前后两半轨迹成对使用 u 与 1-u，样本为每对的平均成本。
+        
+        Args:
+            current_star: 当前星级
+            target_star: 目标星级
+            n: 轨迹数，对偶模式下向上取偶数
+            rng: np.random.Generator
+            antithetic: 是否使用对偶变量
+        
+        Returns:
+            (各样本成本数组, 总尝试次数)
+        """
+        values, rates, downs = self._lookup_tables(target_star)
+        half = (n + 1) // 2 if antithetic else n
+        size = 2 * half if antithetic else n
+        
+        costs = np.zeros(size)
+        attempts_count = 0
+        alive = np.arange(size)
+        current = np.full(size, current_star, dtype=np.int64)
+        while alive.size:
+            attempts_count += alive.size
+            costs[alive] += values[current]
+            
+            u = rng.random(half)
+            if antithetic:
+                u = np.concatenate([u, 1 - u])
+            failed = u[alive] >= rates[current]
+            alive = alive[failed]
+            current = current[failed]
+            current = np.maximum(current - downs[current], 0)
+        
+        metrics.count("simulated_attempts", attempts_count, method="seeded", star=target_star)
+        if antithetic:
+            costs = (costs[:half] + costs[half:]) / 2
+        return costs, attempts_count
+    
+    def simulate_seeded(self, current_star, target_star, num_simulations=10000, seed=0,
+                        antithetic=False, workers=1, block_size=SIMULATION_BLOCK_SIZE):
+        """
+        可复现的分块模拟，相同种子在任意进程数下结果完全一致
+        
+        Args:
+            seed: 随机数种子
+            antithetic: 是否使用对偶变量
+            workers: 工作进程数
+            block_size: 每块的轨迹数
+        
+        Returns:
+            RunningStats，成本样本的均值、标准误及轨迹数、尝试次数
+        """
+        tasks = [(current_star, target_star, seed, block, n, antithetic)
+                 for block, n in enumerate(_block_sizes(num_simulations, block_size))]
+        stats = RunningStats()
+        with _block_pool(self, workers) as run:
+            for result in run(tasks):
+                stats.add(*result)
+        return stats
+    
+    def simulate_adaptive(self, stars, seed=0, target_precision=0.01, confidence=0.95, antithetic=False,
+                          workers=1, block_size=10000, max_simulations=10000000):
+        """
+        按目标精度自适应模拟：每个星级逐块模拟，直到平均成本置信区间的相对半宽
+        不超过 target_precision 或模拟次数达到 max_simulations
+        
+        每轮为所有未收敛的星级各提交若干块并行模拟，但收敛判断按块顺序逐块进行，
+        收敛之后多算的块直接丢弃，因此结果与进程数无关。
+        
+        Args:
+            stars: 目标星级列表，第 i 星模拟 i-1 → i
+            target_precision: 目标相对置信区间半宽，可为 {星级: 目标} 字典
+            confidence: 置信水平
+            block_size: 每块的轨迹数，即收敛判断的粒度
+            max_simulations: 每个星级模拟次数的上限
+        
+        Returns:
+            ({星级: RunningStats}, {星级: 是否达到目标精度})
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        if not isinstance(target_precision, dict):
+            target_precision = dict.fromkeys(stars, target_precision)
+        stats = {star: RunningStats() for star in stars}
+        converged = dict.fromkeys(stars, False)
+        next_block = dict.fromkeys(stars, 0)
+        pending = list(stars)
+        with _block_pool(self, workers) as run:
+            while pending:
+                per_star = max(1, -(-workers // len(pending)))
+                tasks = [
+                    (star - 1, star, seed, block, min(block_size, max_simulations - block * block_size), antithetic)
+                    for star in pending
+                    for block in range(next_block[star], next_block[star] + per_star)
+                    if block * block_size < max_simulations
+                ]
+                for task, result in zip(tasks, run(tasks)):
+                    star = task[1]
+                    if star not in pending:
+                        continue
+                    stats[star].add(*result)
+                    next_block[star] += 1
+                    converged[star] = stats[star].precision(z)[1] <= target_precision[star]
+                    if converged[star] or next_block[star] * block_size >= max_simulations:
+                        pending.remove(star)
+        return stats, converged
+    
+    def compare_configurations(self, other, max_star=16, num_simulations=10000, seed=0,
+                               antithetic=False, block_size=SIMULATION_BLOCK_SIZE):
+        """
+        使用公共随机数比较两组配置的各星级期望成本
+        
+        两个模拟器在每个星级每一块使用同一随机数流，轨迹逐条配对，
+        差值的方差远小于两次独立模拟，相同置信度下所需模拟次数大幅减少。
+        
+        Args:
+            other: 另一组配置的 PunishmentSimulator
+        
+        Returns:
+            {星级: {"difference": 期望成本之差 (self - other), "standard_error": 配对差值的标准误,
+                    "independent_standard_error": 独立模拟时差值的标准误}}
+        """
+        comparison = {}
+        for star in range(7, max_star + 1):
+            a_stats, b_stats, d_stats = RunningStats(), RunningStats(), RunningStats()
+            for block, n in enumerate(_block_sizes(num_simulations, block_size)):
+                a, _ = self.simulate_block(star - 1, star, n, _block_rng(seed, star, block), antithetic)
+                b, _ = other.simulate_block(star - 1, star, n, _block_rng(seed, star, block), antithetic)
+                a_stats.add_samples(a)
+                b_stats.add_samples(b)
+                d_stats.add_samples(a - b)
+            comparison[star] = {
+                "difference": d_stats.mean,
+                "standard_error": d_stats.standard_error,
+                "independent_standard_error": float(np.hypot(a_stats.standard_error, b_stats.standard_error))
+            }
+        return comparison
+    
+    def solve_markov_chain(self, max_star=16):
+        """
+        将失败降级过程视为吸收马尔可夫链，精确求解期望成本、期望尝试次数及其方差
+        
+        状态为主卡当前星级 c，每次尝试花费 base_card_values[c]，以 success_rates[c+1]
+        的概率成功（进入吸收态），否则按降级表转移到 c - downgrade_levels[c]。
+        转移只与当前星级有关，因此一次线性求解即可得到所有星级的结果：
+            (I - Q) E = r
+            (I - Q) M = r^2 + 2 r * (Q E)，方差 = M - E^2
+        
+        Args:
+            max_star: 最大星级
+        
+        Returns:
+            字典，各项均为以主卡当前星级为下标的数组：
+            expected_costs, cost_variance, expected_attempts, attempts_variance
+        """
+        values, rates, downs = self._lookup_tables(max_star)
+        states = np.arange(max_star)
+        
+        # 失败后的转移矩阵（未成功部分）
+        Q = np.zeros((max_star, max_star))
+        np.add.at(Q, (states, np.maximum(states - downs, 0)), 1 - rates)
+        A = np.eye(max_star) - Q
+        
+        # 两列奖励同时求解：每次尝试的成本、每次尝试计 1 次
+        rewards = np.column_stack([values, np.ones(max_star)])
+        first = np.linalg.solve(A, rewards)
+        second = np.linalg.solve(A, rewards**2 + 2 * rewards * (Q @ first))
+        variance = np.maximum(second - first**2, 0)
+        
+        return {
+            "expected_costs": first[:, 0],
+            "cost_variance": variance[:, 0],
+            "expected_attempts": first[:, 1],
+            "attempts_variance": variance[:, 1]
+        }
+    
+    def markov_factors(self, card_values, success_rates):
+        """
+        精确求解给定卡片价值与成功率下的惩罚因子，可对多组同时求解
+        
+        与 calculate_punishment_factors(method="markov") 的定义与结果相同（至舍入误差）：
+        第 star 星的惩罚因子为失败降级下的期望成本与 card_values[star-1] / success_rates[star] 之比，
+        6 星及以下为 1。降级表取自模拟器配置
+        
+        Args:
+            card_values: 各星级卡片价值 (..., max_star + 1)，例如求解结果的 Vcard_mins
+            success_rates: 各星级强化的成功率 (..., max_star + 1)，例如求解结果的 probabilities，下标 0 不使用
+        
+        Returns:
+            惩罚因子数组 (..., max_star + 1)，下标为目标星级，下标 0 不使用
+        """
+        card_values = np.asarray(card_values, dtype=float)
+        success_rates = np.asarray(success_rates, dtype=float)
+        max_star = card_values.shape[-1] - 1
+        _, _, downs = self._lookup_tables(max_star)
+        # 失败只会降到更低星级（或停留在原星级），转移矩阵为下三角，
+        # 逐星级前向代入即可得到期望成本，无需线性求解：
+        #     E[c] = V[c] + (1 - p) E[c - d]，d = 0 时 E[c] = V[c] / p
+        expected = np.zeros(card_values.shape[:-1] + (max_star,))
+        for c in range(max_star):
+            target = max(c - downs[c], 0)
+            if target == c:
+                expected[..., c] = card_values[..., c] / success_rates[..., c + 1]
+            else:
+                expected[..., c] = card_values[..., c] + (1 - success_rates[..., c + 1]) * expected[..., target]
+        factors = np.ones(card_values.shape)
+        factors[..., 7:] = expected[..., 6:] / (card_values[..., 6:-1] / success_rates[..., 7:])
+        return factors
+    
+    def calculate_punishment_factors(self, max_star=16, num_simulations=10000, method="loop",
+                                     seed=None, workers=1, antithetic=False,
+                                     target_precision=None, confidence=0.95, max_simulations=10000000,
+                                     cache=None):
         """
         计算各星级强化的惩罚因子
         
         Args:
             max_star: 最大星级
             num_simulations: 每个星级的模拟次数
+            method: 模拟方式，"loop" 为逐次循环模拟，"vectorized" 为向量化批量模拟，
+                    "markov" 为马尔可夫链精确求解（忽略 num_simulations），
+                    "seeded" 为可复现的分块模拟（按 seed 派生各星级各块的独立随机数流）
+            seed: "seeded" 模式的随机数种子，None 表示随机生成并记录在结果中
+            workers: "seeded" 模式的工作进程数，所有星级的所有块一起分配
+            antithetic: "seeded" 模式是否使用对偶变量
+            target_precision: "seeded" 模式的目标相对置信区间半宽（可为 {星级: 目标} 字典），
+                              给定时每个星级自适应模拟至达到目标，num_simulations 作为每块的轨迹数
+            confidence: 置信区间的置信水平
+            max_simulations: 自适应模拟时每个星级模拟次数的上限
+            cache: ResultCache，给定时按全部输入与本模块源码缓存结果；
+                   只缓存可复现的 "markov" 与给定 seed 的 "seeded" 模式
         
         Returns:
             惩罚因子字典 {星级: 惩罚因子}
+        
+        Raises:
+            ValueError: 非 "seeded" 模式给定了 seed、workers、antithetic 或 target_precision
         """
+        if method != "seeded" and (seed is not None or workers != 1 or antithetic or target_precision is not None):
+            raise ValueError(f"seed、workers、antithetic 与 target_precision 只适用于 \"seeded\" 模式，当前为 \"{method}\"")
+        
+        if cache is not None and (method == "markov" or (method == "seeded" and seed is not None)):
+            inputs = self.simulation_inputs(max_star, num_simulations, method, seed, antithetic,
+                                            target_precision, confidence, max_simulations)
+            
+            def compute():
+                self.calculate_punishment_factors(max_star, num_simulations, method, seed, workers, antithetic,
+                                                  target_precision, confidence, max_simulations)
+                return {"punishment_factors": self.punishment_factors, "simulated_values": self.simulated_values}
+            
+            values, _ = cache.get_or_compute("punishment_factors", inputs, compute,
+                                             code_version(sys.modules[__name__]))
+            # 从 JSON 读回时星级键为字符串
+            self.punishment_factors = _star_keys(values["punishment_factors"])
+            self.simulated_values = {name: _star_keys(value) if name in STAR_KEYED else value
+                                     for name, value in values["simulated_values"].items()}
+            return self.punishment_factors
+        
         # 计算不考虑失败惩罚的理论成本
         theoretical_costs = {}
         for star in range(1, max_star + 1):
@@ -97,16 +637,64 @@ class PunishmentSimulator:
             else:
                 theoretical_costs[star] = self.base_card_values[star-1] / self.success_rates[star]
         
+        cost_variance = {}
+        precision = {}
+        if method == "loop":
+            simulate = self.simulate_enhancement
+        elif method == "vectorized":
+            simulate = self.simulate_enhancement_vectorized
+        elif method == "markov":
+            chain = self.solve_markov_chain(max_star)
+            
+            def simulate(current_star, target_star, num_simulations):
+                cost_variance[target_star] = float(chain["cost_variance"][current_star])
+                return (float(chain["expected_costs"][current_star]),
+                        float(chain["expected_attempts"][current_star]))
+        elif method == "seeded":
+            if seed is None:
+                seed = np.random.SeedSequence().entropy
+            stars = list(range(7, max_star + 1))
+            if target_precision is None:
+                seeded = {star: self.simulate_seeded(star - 1, star, num_simulations, seed, antithetic, workers)
+                          for star in stars}
+                converged = {}
+            else:
+                seeded, converged = self.simulate_adaptive(
+                    stars, seed, target_precision, confidence, antithetic, workers,
+                    block_size=num_simulations, max_simulations=max_simulations)
+            z = NormalDist().inv_cdf(0.5 + confidence / 2)
+            
+            def simulate(current_star, target_star, num_simulations):
+                stats = seeded[target_star]
+                half_width, relative = stats.precision(z)
+                precision[target_star] = {
+                    "trials": stats.trajectories,
+                    "standard_error": stats.standard_error,
+                    "ci_half_width": half_width,
+                    "relative_ci_half_width": relative,
+                    "confidence": confidence
+                }
+                if target_star in converged:
+                    precision[target_star]["target"] = (
+                        target_precision[target_star] if isinstance(target_precision, dict) else target_precision)
+                    precision[target_star]["converged"] = converged[target_star]
+                return stats.mean, stats.attempts / stats.trajectories
+        else:
+            raise ValueError(f"未知的模拟方式: {method}")
+        
         # 计算考虑失败惩罚的模拟成本
         simulated_costs = {}
         avg_attempts = {}
         
+        from tqdm import tqdm
+
         for star in tqdm(range(1, max_star + 1), desc="Simulating star levels"):
             if star <= 6:  # 6星及以下不考虑失败惩罚
                 simulated_costs[star] = theoretical_costs[star]
                 avg_attempts[star] = 1 / self.success_rates[star]
             else:
-                sim_cost, sim_attempts = self.simulate_enhancement(star-1, star, num_simulations)
+                with metrics.timer("simulate", method=method, star=star):
+                    sim_cost, sim_attempts = simulate(star-1, star, num_simulations)
                 simulated_costs[star] = sim_cost
                 avg_attempts[star] = sim_attempts
         
@@ -123,6 +711,15 @@ class PunishmentSimulator:
             "simulated_costs": simulated_costs,
             "avg_attempts": avg_attempts
         }
+        if cost_variance:
+            self.simulated_values["cost_variance"] = cost_variance
+        if method == "seeded":
+            self.simulated_values["seed"] = seed
+            self.simulated_values["antithetic"] = antithetic
+            self.simulated_values["precision"] = precision
+        self.simulated_values["inputs"] = self.simulation_inputs(
+            max_star, num_simulations, method, seed, antithetic, target_precision, confidence, max_simulations)
+        self.simulated_values["code_version"] = code_version(sys.modules[__name__])
         self.punishment_factors = punishment_factors
         
         return punishment_factors
@@ -133,6 +730,9 @@ class PunishmentSimulator:
             print("请先运行 calculate_punishment_factors 方法")
             return
         
+        # 只在绘图时导入 matplotlib，命令行与无界面环境无需加载
+        import matplotlib.pyplot as plt
+
         stars = list(self.punishment_factors.keys())
         factors = list(self.punishment_factors.values())
         
@@ -183,76 +783,65 @@ class PunishmentSimulator:
             "simulated_costs": self.simulated_values.get("simulated_costs", {}),
             "avg_attempts": self.simulated_values.get("avg_attempts", {})
         }
+        for key in ("cost_variance", "seed", "antithetic", "precision", "inputs", "code_version"):
+            if key in self.simulated_values:
+                results[key] = self.simulated_values[key]
         
         with open(os.path.join(output_dir, "punishment_simulation_results.json"), "w", encoding="utf-8") as f:
             json.dump(results, f, ensure_ascii=False, indent=4)
         
         print(f"结果已保存到 {os.path.join(output_dir, 'punishment_simulation_results.json')}")
 
-def main():
-    # 示例基础卡片价值（可以从之前的模型结果中加载）
-    base_card_values = {
-        0: 1,
-        1: 1,
-        2: 2,
-        3: 4,
-        4: 8,
-        5: 16,
-        6: 32,
-        7: 64,
-        8: 128,
-        9: 256,
-        10: 512,
-        11: 1024,
-        12: 2048,
-        13: 4096,
-        14: 8192,
-        15: 16384
-    }
-    
-    # 成功率配置
-    success_rates = {
-        1: 1.0,   # 0→1星
-        2: 1.0,   # 1→2星
-        3: 0.968, # 2→3星
-        4: 0.686, # 3→4星
-        5: 0.495, # 4→5星
-        6: 0.396, # 5→6星
-        7: 0.319, # 6→7星
-        8: 0.264, # 7→8星
-        9: 0.220, # 8→9星
-        10: 0.135, # 9→10星
-        11: 0.125, # 10→11星
-        12: 0.116, # 11→12星
-        13: 0.107, # 12→13星
-        14: 0.101, # 13→14星
-        15: 0.095, # 14→15星
-        16: 0.088  # 15→16星
-    }
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="卡片强化失败惩罚模拟")
+    parser.add_argument("--method", choices=["loop", "vectorized", "seeded", "markov"], default="vectorized",
+                        help="模拟方式，seeded 为可复现的分块模拟")
+    parser.add_argument("--num-simulations", type=int, default=5000, help="每个星级的模拟次数")
+    parser.add_argument("--seed", type=int, help="seeded 模式的随机数种子")
+    parser.add_argument("--workers", type=int, help="seeded 模式的工作进程数，默认 1")
+    parser.add_argument("--antithetic", action="store_true", help="seeded 模式使用对偶变量")
+    parser.add_argument("--target-precision", type=float,
+                        help="seeded 模式的目标相对置信区间半宽，给定时逐块模拟至达到目标，"
+                             "--num-simulations 作为每块的轨迹数")
+    parser.add_argument("--confidence", type=float, help="seeded 模式置信区间的置信水平，默认 0.95")
+    parser.add_argument("--max-simulations", type=int,
+                        help="seeded 模式自适应模拟时每个星级模拟次数的上限，默认 10000000")
+    parser.add_argument("--no-plot", action="store_true", help="不绘制结果图表（无界面环境）")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY,
+                        help="结果缓存目录，markov 与给定 --seed 的 seeded 模式按全部输入复用已有结果")
+    parser.add_argument("--no-cache", action="store_true", help="不读写结果缓存")
+    args = parser.parse_args(argv)
     
-    # 降级等级配置
-    downgrade_levels = {
-        6: 1,   # 6→7星失败降到5星
-        7: 1,   # 7→8星失败降到6星
-        8: 1,   # 8→9星失败降到7星
-        9: 1,   # 9→10星失败降到8星
-        10: 1,  # 10→11星失败降到9星
-        11: 1,  # 11→12星失败降到10星
-        12: 1,  # 12→13星失败降到11星
-        13: 1,  # 13→14星失败降到12星
-        14: 1,  # 14→15星失败降到13星
-        15: 1   # 15→16星失败降到14星
+    # 这些参数只对 seeded 模式生效，其他模式下给出时报错，而不是静默忽略
+    seeded_options = {
+        "--seed": args.seed is not None,
+        "--workers": args.workers is not None,
+        "--antithetic": args.antithetic,
+        "--target-precision": args.target_precision is not None,
+        "--confidence": args.confidence is not None,
+        "--max-simulations": args.max_simulations is not None
     }
+    given = [name for name, used in seeded_options.items() if used]
+    if given and args.method != "seeded":
+        parser.error(f"{'、'.join(given)} 只适用于 --method seeded，当前为 --method {args.method}")
+    workers = 1 if args.workers is None else args.workers
+    confidence = 0.95 if args.confidence is None else args.confidence
+    max_simulations = 10000000 if args.max_simulations is None else args.max_simulations
     
     # 创建模拟器
     simulator = PunishmentSimulator(
-        base_card_values=base_card_values,
-        success_rates=success_rates,
-        downgrade_levels=downgrade_levels
+        base_card_values=BASE_CARD_VALUES,
+        success_rates=SUCCESS_RATES,
+        downgrade_levels=DOWNGRADE_LEVELS
     )
     
     # 计算惩罚因子
-    punishment_factors = simulator.calculate_punishment_factors(num_simulations=5000)
+    punishment_factors = simulator.calculate_punishment_factors(
+        num_simulations=args.num_simulations, method=args.method,
+        seed=args.seed, workers=workers, antithetic=args.antithetic,
+        target_precision=args.target_precision, confidence=confidence,
+        max_simulations=max_simulations,
+        cache=None if args.no_cache else ResultCache(args.cache_dir))
     
     # 打印结果
     print("\n惩罚因子:")
@@ -260,7 +849,8 @@ def main():
         print(f"{star}星: {factor:.4f}")
     
     # 绘制结果
-    simulator.plot_results()
+    if not args.no_plot:
+        simulator.plot_results()
     
     # 保存结果
     simulator.save_results(output_dir="e:\\FoodVsRats-CardEnhanceModel\\outputjson\\punishment_simulation")
@@ -0,0 +1,301 @@
+"""
+Author: HPC2H2
+Date: 2025-09-03
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 按内容寻址的磁盘结果缓存。
+             惩罚因子与全场景求解结果按（命名空间, 全部输入, 相关源码的哈希）计算 sha256 作为键，
+             跨运行、跨进程复用；输入或代码有任何改动都会得到新的键，不会读到过期结果。
+             每个条目是一个目录：meta.json 记录命名空间、输入与可 JSON 序列化的值，
+             数组各存为一个 .npy 文件，读取时以内存映射方式打开。
+             条目先写入临时目录再整体重命名，其他进程只会看到完整的条目；
+             总大小超出上限时按最近访问时间淘汰最久未用的条目。
+
+             默认目录为 outputjson/cache，可用环境变量 FVR_CACHE_DIR 修改。
+
+用法：
+    python result_cache.py                  列出缓存条目
+    python result_cache.py --max-bytes 1e8  淘汰至 100MB 以内
+    python result_cache.py --clear          清空缓存
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import numpy as np
+
+from instrumentation import metrics
+
+DEFAULT_DIRECTORY = os.environ.get("FVR_CACHE_DIR", os.path.join("outputjson", "cache"))
+DEFAULT_MAX_BYTES = 1 << 30
+# 条目格式版本，格式改变时递增使旧条目失效
+CACHE_VERSION = 1
+META_FILENAME = "meta.json"
+# 超过该时间（秒）仍未完成的临时目录视为中断的写入，淘汰时一并删除
+STALE_SECONDS = 3600
+
+
+def _jsonable(value):
+    """
+    将输入转换为可 JSON 序列化的结构，数组以 dtype、形状与内容哈希表示
+
+    浮点数由 json 按 repr 输出，与数值逐位对应；字典的键转为字符串
+    """
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {"ndarray": array.dtype.str, "shape": list(array.shape),
+                "sha256": hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def canonical(value):
+    """
+    输入的规范形式，与写入 meta.json 后读回的结果相同，可直接比较
+
+    Args:
+        value: 由字典、列表、数值、字符串与 numpy 数组组成的输入
+
+    Returns:
+        JSON 往返后的结构
+    """
+    return json.loads(json.dumps(_jsonable(value), sort_keys=True))
+
+
+def code_version(*modules):
+    """
+    计算影响结果的源码版本
+
+    Args:
+        modules: 产生结果的模块
+
+    Returns:
+        各模块源文件内容的 sha256（十六进制前 16 位）
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """按内容寻址的磁盘缓存，键由输入与代码版本决定"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, max_entries=None):
+        """
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存总大小上限（字节），写入新条目后超出时淘汰最久未用的条目
+            max_entries: 条目数上限，None 表示不限
+        """
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def key(self, namespace, inputs, code=""):
+        """
+        计算缓存键
+
+        Args:
+            namespace: 结果种类，例如 "punishment_factors"
+            inputs: 决定结果的全部输入
+            code: 代码版本，见 code_version
+
+        Returns:
+            sha256 十六进制字符串
+        """
+        text = json.dumps({"namespace": namespace, "version": CACHE_VERSION, "code": code,
+                           "inputs": _jsonable(inputs)}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        读取条目
+
+        Returns:
+            {名称: 值} 字典，数组为只读内存映射；不存在时返回 None
+        """
+        entry = self._entry_path(key)
+        meta_path = os.path.join(entry, META_FILENAME)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            values = dict(meta["values"])
+            for name in meta["arrays"]:
+                values[name] = np.load(os.path.join(entry, name + ".npy"), mmap_mode="r")
+        except FileNotFoundError:
+            # 不存在，或读取过程中被其他进程淘汰
+            return None
+        try:
+            # meta.json 的修改时间即最近访问时间
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return values
+
+    def put(self, key, values, namespace="", inputs=None):
+        """
+        写入条目，已存在时保留先写入的一份
+
+        Args:
+            key: 缓存键
+            values: {名称: 值}，numpy 数组存为 .npy，其余值须可 JSON 序列化
+            namespace: 结果种类，记录在 meta.json 中
+            inputs: 决定结果的输入，记录在 meta.json 中以便追溯
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            arrays = [name for name, value in values.items() if isinstance(value, np.ndarray)]
+            for name in arrays:
+                np.save(os.path.join(temp, name + ".npy"), values[name], allow_pickle=False)
+            meta = {
+                "namespace": namespace,
+                "created": time.time(),
+                "inputs": _jsonable(inputs),
+                "arrays": arrays,
+                "values": {name: value for name, value in values.items() if name not in arrays}
+            }
+            with open(os.path.join(temp, META_FILENAME), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            entry = self._entry_path(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(temp, entry)
+            except OSError:
+                # 其他进程已写入相同的键
+                if not os.path.isdir(entry):
+                    raise
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+        self.evict(keep=key)
+
+    def get_or_compute(self, namespace, inputs, compute, code=""):
+        """
+        命中时读取缓存，否则调用 compute 计算并写入
+
+        Args:
+            namespace: 结果种类
+            inputs: 决定结果的全部输入
+            compute: 无参数函数，返回 {名称: 值} 字典
+            code: 代码版本，见 code_version
+
+        Returns:
+            (值字典, 是否命中)。命中时数组为只读内存映射，字典的键均为字符串
+        """
+        key = self.key(namespace, inputs, code)
+        values = self.get(key)
+        if values is not None:
+            metrics.count("cache_hits", namespace=namespace)
+            return values, True
+        metrics.count("cache_misses", namespace=namespace)
+        values = compute()
+        self.put(key, values, namespace, inputs)
+        return values, False
+
+    def entries(self):
+        """
+        列出所有条目
+
+        Returns:
+            [(键, 最近访问时间, 字节数, 命名空间), ...]，按最近访问时间升序
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in os.listdir(self.directory):
+            group = os.path.join(self.directory, prefix)
+            if prefix.startswith(".tmp-") or not os.path.isdir(group):
+                continue
+            for key in os.listdir(group):
+                entry = os.path.join(group, key)
+                try:
+                    accessed = os.path.getmtime(os.path.join(entry, META_FILENAME))
+                    size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+                    with open(os.path.join(entry, META_FILENAME), "r", encoding="utf-8") as f:
+                        namespace = json.load(f).get("namespace", "")
+                except (OSError, ValueError):
+                    continue
+                entries.append((key, accessed, size, namespace))
+        entries.sort(key=lambda item: item[1])
+        return entries
+
+    def evict(self, keep=None):
+        """
+        按最近访问时间淘汰条目，直到总大小与条目数都不超过上限，并删除中断写入留下的临时目录
+
+        Args:
+            keep: 不淘汰的键（刚写入的条目）
+
+        Returns:
+            淘汰的条目数
+        """
+        now = time.time()
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            path = os.path.join(self.directory, name)
+            if name.startswith(".tmp-") and now - os.path.getmtime(path) > STALE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+        entries = self.entries()
+        total = sum(entry[2] for entry in entries)
+        count = len(entries)
+        evicted = 0
+        for key, _, size, _ in entries:
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            if key == keep:
+                continue
+            # 已被其他进程以内存映射打开的文件在 POSIX 上删除后仍可读取
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            total -= size
+            count -= 1
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        """删除整个缓存目录"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查看与清理结果缓存")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY, help="缓存目录")
+    parser.add_argument("--max-bytes", type=float, help="淘汰最久未用的条目直到总大小不超过该值")
+    parser.add_argument("--max-entries", type=int, help="淘汰最久未用的条目直到条目数不超过该值")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"已清空 {cache.directory}")
+        return
+    if args.max_bytes is not None or args.max_entries is not None:
+        cache.max_bytes = DEFAULT_MAX_BYTES if args.max_bytes is None else int(args.max_bytes)
+        cache.max_entries = args.max_entries
+        print(f"淘汰 {cache.evict()} 个条目")
+
+    entries = cache.entries()
+    for key, accessed, size, namespace in reversed(entries):
+        print(f"{key[:16]}  {namespace:<20} {size / 1024:>10.1f} KB  "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(accessed))}")
+    print(f"共 {len(entries)} 个条目，{sum(entry[2] for entry in entries) / 1024 ** 2:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Author: HPC2H2
+Date: 2025-08-15
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 所有场景结果的列式二进制存储。
+             文件由魔数、JSON 头部和一个 (VIP × 公会 × 星级 × 字段) 的 float64 数组组成，
+             加载时内存映射数组，切片查询无需解析整个文件；单次查询可直接读取一行，不加载 numpy。
+             也可以从 outputjson/ 下按场景保存的 JSON 目录转换而来。
+"""
+
+import os
+import re
+import json
+import struct
+import argparse
+
+from strategy_builder import StrategyRecord, CLOVER_LEVELS, engine_probability
+
+MAGIC = b"FVRSTORE"
+VERSION = 1
+# 数组数据起始位置按此字节数对齐
+ALIGNMENT = 64
+FIELDS = ("价值", "成本", "性价比", "成功概率", "四叶草等级", "同星副卡数", "低一星副卡数", "低二星副卡数")
+JSON_FILENAME = "VIP等级：{vip}  公会等级：{guild}.json"
+
+
+def sweep_to_array(result):
+    """
+    将 solve_enhancement_sweep 的结果转换为 (VIP, 公会, 星级, 字段) 数组，星级从 1 开始
+
+    Args:
+        result: solve_enhancement_sweep 的返回值，场景形状为 (VIP, 公会)
+
+    Returns:
+        float64 数组，最后一维顺序与 FIELDS 一致
+    """
+    import numpy as np
+
+    columns = [
+        result["Vcard_mins"],
+        result["cost_mins"],
+        result["cost_effectiveness"],
+        result["probabilities"],
+        result["clover_indices"],
+        result["card_counts"][..., 0],
+        result["card_counts"][..., 1],
+        result["card_counts"][..., 2]
+    ]
+    return np.stack(columns, axis=-1)[:, :, 1:, :].astype(np.float64)
+
+
+def save_store(path, data, model=""):
+    """
+    保存列式二进制结果文件
+
+    Args:
+        path: 输出文件路径
+        data: (VIP, 公会, 星级, 字段) 数组，见 sweep_to_array
+        model: 模型名称，记录在头部
+    """
+    import numpy as np
+
+    data = np.ascontiguousarray(data, dtype="<f8")
+    header = {
+        "version": VERSION,
+        "model": model,
+        "shape": list(data.shape),
+        "dtype": "<f8",
+        "first_star": 1,
+        "fields": list(FIELDS)
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = len(MAGIC) + 4
+    padding = -(prefix + len(header_bytes)) % ALIGNMENT
+    header_bytes += b" " * padding
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(data.tobytes())
+
+
+def _read_header(f, path):
+    """
+    读取文件头部
+
+    Returns:
+        (头部字典, 数组数据起始位置)
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"不是有效的结果文件: {path}")
+    (header_length,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(header_length).decode("utf-8"))
+    if header["version"] != VERSION:
+        raise ValueError(f"不支持的结果文件版本: {header['version']}")
+    return header, len(MAGIC) + 4 + header_length
+
+
+def _record_of(row, star):
+    """由字段字典构造策略记录"""
+    cards = []
+    for t, name in enumerate(("同星副卡数", "低一星副卡数", "低二星副卡数")):
+        cards += [star - 1 - t] * int(row[name])
+    return StrategyRecord(cards, int(row["四叶草等级"]), engine_probability(row["成功概率"]), row["成本"])
+
+
+def read_row(path, vip, guild, star):
+    """
+    只读取单个场景单个星级的一行，不依赖 numpy，供命令行单次查询使用
+
+    Returns:
+        (字段字典, StrategyRecord)
+
+    Raises:
+        KeyError: 场景或星级超出范围
+    """
+    with open(path, "rb") as f:
+        header, offset = _read_header(f, path)
+        n_vip, n_guild, n_star, n_fields = header["shape"]
+        s = star - header["first_star"]
+        if not (0 <= vip < n_vip and 0 <= guild < n_guild and 0 <= s < n_star):
+            raise KeyError((vip, guild, star))
+        f.seek(offset + ((vip * n_guild + guild) * n_star + s) * n_fields * 8)
+        row = dict(zip(header["fields"], struct.unpack(f"<{n_fields}d", f.read(n_fields * 8))))
+    return row, _record_of(row, star)
+
+
+class ResultStore:
+    """内存映射的结果文件，按 (VIP, 公会, 星级, 字段) 切片查询"""
+
+    def __init__(self, path):
+        import numpy as np
+
+        with open(path, "rb") as f:
+            self.header, offset = _read_header(f, path)
+
+        self.fields = tuple(self.header["fields"])
+        self.first_star = self.header["first_star"]
+        self.data = np.memmap(path, dtype=self.header["dtype"], mode="r", offset=offset,
+                              shape=tuple(self.header["shape"]))
+
+    @property
+    def shape(self):
+        """(VIP 等级数, 公会等级数, 星级数, 字段数)"""
+        return self.data.shape
+
+    def query(self, vip=slice(None), guild=slice(None), star=slice(None), field=None):
+        """
+        切片查询，只读取所需部分
+
+        Args:
+            vip: VIP 等级，整数或切片
+            guild: 公会等级，整数或切片
+            star: 目标星级（从 1 开始），整数或切片
+            field: 字段名或字段名列表，None 表示所有字段
+
+        Returns:
+            对应切片的数组
+        """
+        if isinstance(star, slice):
+            start = None if star.start is None else star.start - self.first_star
+            stop = None if star.stop is None else star.stop - self.first_star
+            star = slice(start, stop, star.step)
+        else:
+            star = star - self.first_star
+
+        if field is None:
+            field = slice(None)
+        elif isinstance(field, str):
+            field = self.fields.index(field)
+        else:
+            field = [self.fields.index(name) for name in field]
+        import numpy as np
+
+        return np.asarray(self.data[vip, guild, star, field])
+
+    def strategy_record(self, vip, guild, star):
+        """取出单个场景单个星级的策略记录"""
+        return _record_of(dict(zip(self.fields, self.query(vip, guild, star).tolist())), star)
+
+
+_CARDS_PATTERN = re.compile(r"使用卡片:([\d ]*)")
+_CLOVER_PATTERN = re.compile(r"四叶草等级：(\S+)")
+_PROBABILITY_PATTERN = re.compile(r"成功概率：(\S+)")
+
+
+def parse_strategy(text, star):
+    """
+    解析原模型的策略字符串
+
+    Args:
+        text: 策略字符串，例如 "7→8 使用卡片:6 四叶草等级：2 成功概率：0.2968"
+        star: 目标星级
+
+    Returns:
+        (同星/低一星/低二星副卡数量列表, 四叶草等级下标, 成功概率)
+    """
+    counts = [0, 0, 0]
+    for card in _CARDS_PATTERN.search(text).group(1).split():
+        counts[star - 1 - int(card)] += 1
+    clover = _CLOVER_PATTERN.search(text)
+    probability = _PROBABILITY_PATTERN.search(text)
+    return (counts,
+            CLOVER_LEVELS.index(clover.group(1)) if clover else 0,
+            float(probability.group(1)) if probability else float("nan"))
+
+
+def convert_json_directory(json_dir, path, model=""):
+    """
+    将按场景保存的 JSON 目录转换为一个列式二进制结果文件
+
+    Args:
+        json_dir: JSON 目录，例如 outputjson/model_with_punishment
+        path: 输出文件路径
+        model: 模型名称，默认使用目录名
+    """
+    import numpy as np
+
+    scenarios = {}
+    for filename in os.listdir(json_dir):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        scenarios[(data["当前VIP等级"], data["当前公会等级"])] = data
+
+    n_vip = max(vip for vip, _ in scenarios) + 1
+    n_guild = max(guild for _, guild in scenarios) + 1
+    n_star = max(len(data["单张卡片的价值"]) for data in scenarios.values())
+    array = np.full((n_vip, n_guild, n_star, len(FIELDS)), np.nan)
+
+    for (vip, guild), data in scenarios.items():
+        for key, values in data["单张卡片的价值"].items():
+            star = int(key)
+            counts, clover, probability = parse_strategy(data["最佳策略"][key], star)
+            array[vip, guild, star - 1] = [
+                values["价值"], values["成本"], values.get("性价比", 0),
+                probability, clover, *counts
+            ]
+
+    save_store(path, array, model or os.path.basename(os.path.normpath(json_dir)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="将按场景保存的 JSON 结果转换为列式二进制结果文件")
+    parser.add_argument("json_dir", help="JSON 目录，例如 outputjson/model_with_punishment")
+    parser.add_argument("output", help="输出文件路径，例如 outputjson/model_with_punishment.fvr")
+    args = parser.parse_args(argv)
+
+    convert_json_directory(args.json_dir, args.output)
+    print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Author: HPC2H2
+Date: 2025-08-20
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 卡片价值对所有输入表格的批量敏感性分析。
+             在最优策略固定的前提下，沿动态规划逐星级做前向模式求导，
+             一次求得所有场景、所有星级的卡片价值对每个输入参数的导数与弹性。
+"""
+
+import numpy as np
+
+from enhancement_engine import solve_enhancement_sweep, scenario_multipliers, P_LIST_ROWS, STAR_LIMIT
+
+
+def parameter_names(VIP_additions, guild_additions, n_clovers, star_limit=STAR_LIMIT,
+                    with_punishment=False):
+    """敏感性数组最后一维各参数的名称"""
+    names = [f"p_list[{row}][{i}]" for row in P_LIST_ROWS for i in range(1, star_limit + 1)]
+    names += [f"clover_additions[{k}]" for k in range(n_clovers)]
+    names += [f"Vclovers[{k}]" for k in range(n_clovers)]
+    names += [f"VIP_additions[{v}]" for v in range(len(VIP_additions))]
+    names += [f"guild_additions[{g}]" for g in range(len(guild_additions))]
+    if with_punishment:
+        names += [f"punishment_factors[{i}]" for i in range(1, star_limit + 1)]
+    return names
+
+
+def solve_sensitivity(p_list, clover_additions, Vclovers, VIP_additions, guild_additions,
+                      punishment_factors=None, star_limit=STAR_LIMIT, max_total=3):
+    """
+    求各场景各星级卡片价值 Vcard_mins[i] 对每个输入参数的导数和弹性
+
+    最优策略的选择是分段常数，导数在最优策略不变的邻域内成立；
+    成功概率被截断为 1 的候选对概率类参数的导数为 0。
+
+    Args:
+        p_list: 成功率表
+        clover_additions: 各四叶草等级的概率加成倍数
+        Vclovers: 各四叶草等级的价值
+        VIP_additions: 各VIP等级的加成
+        guild_additions: 各公会等级的加成
+        punishment_factors: 惩罚因子字典 {星级: 惩罚因子}，None 表示不考虑失败惩罚
+        star_limit: 最大星级
+        max_total: 副卡数量上限
+
+    Returns:
+        字典：
+            parameters: 参数名称列表
+            values: 参数取值 (n_params,)
+            result: solve_enhancement_sweep 的求解结果
+            derivatives: dVcard_mins / d参数，形状 (VIP, 公会, star_limit + 1, n_params)
+            elasticities: 弹性 (d卡片价值/卡片价值) / (d参数/参数)，形状同上
+    """
+    n_clovers = len(clover_additions)
+    clover_additions = np.asarray(clover_additions, dtype=float)
+    Vclovers = np.asarray(Vclovers, dtype=float)[:n_clovers]
+    multipliers = scenario_multipliers(VIP_additions, guild_additions)
+    result = solve_enhancement_sweep(p_list, clover_additions, Vclovers, multipliers,
+                                     punishment_factors, star_limit, max_total)
+
+    names = parameter_names(VIP_additions, guild_additions, n_clovers, star_limit,
+                            punishment_factors is not None)
+    n_params = len(names)
+    n_vip, n_guild = multipliers.shape
+    n_scenarios = n_vip * n_guild
+    scenarios = np.arange(n_scenarios)
+
+    # 各参数块在最后一维中的起始位置
+    p_offset = 0
+    clover_offset = p_offset + len(P_LIST_ROWS) * star_limit
+    Vclover_offset = clover_offset + n_clovers
+    vip_offset = Vclover_offset + n_clovers
+    guild_offset = vip_offset + len(VIP_additions)
+    factor_offset = guild_offset + len(guild_additions)
+
+    values = np.concatenate([
+        [float(p_list[row][i]) for row in P_LIST_ROWS for i in range(1, star_limit + 1)],
+        clover_additions, Vclovers,
+        np.asarray(VIP_additions, dtype=float), np.asarray(guild_additions, dtype=float),
+        [punishment_factors[i] for i in range(1, star_limit + 1)] if punishment_factors is not None else []
+    ])
+
+    def p_index(t, i):
+        """同星/低一星/低二星（t=0/1/2）副卡第 i 星成功率的参数下标"""
+        return p_offset + t * star_limit + (i - 1)
+
+    # 各场景加成倍数对 VIP/公会加成的导数
+    d_multiplier = np.zeros((n_vip, n_guild, n_params))
+    d_multiplier[np.arange(n_vip), :, vip_offset + np.arange(n_vip)] = 1
+    d_multiplier[:, np.arange(n_guild), guild_offset + np.arange(n_guild)] = 1
+    d_multiplier = d_multiplier.reshape(n_scenarios, n_params)
+    multipliers = multipliers.reshape(-1)
+
+    Vcard_mins = result["Vcard_mins"].reshape(n_scenarios, -1)
+    counts = result["card_counts"].reshape(n_scenarios, -1, 3)
+    clover_indices = result["clover_indices"].reshape(n_scenarios, -1)
+    d_Vcard = np.zeros((n_scenarios, star_limit + 1, n_params))
+
+    for i in range(1, star_limit + 1):
+        if i == 1:
+            # cost = V0 / p3，V0 为常数 1
+            p3 = float(p_list[3][i])
+            d_Vcard[:, i, p_index(0, i)] = -Vcard_mins[:, 0] / p3**2
+            continue
+
+        count = counts[:, i].astype(float)
+        k = clover_indices[:, i]
+        type_probabilities = np.array([p_list[row][i] for row in P_LIST_ROWS], dtype=float)
+
+        # 不含加成的成功概率：第一张卡取全额，其余每张取 1/3
+        first = np.argmax(count > 0, axis=1)
+        weights = count / 3
+        weights[scenarios, first] += 2 / 3
+        base_p = weights @ type_probabilities
+        d_base_p = np.zeros((n_scenarios, n_params))
+        for t in range(3):
+            d_base_p[:, p_index(t, i)] = np.where(base_p < 1, weights[:, t], 0)
+        base_p = np.minimum(base_p, 1)
+
+        # 加成后的成功概率 P = min(base_p × 四叶草加成 × 加成倍数, 1)
+        clover = clover_additions[k]
+        raw_p = base_p * clover * multipliers
+        d_p = (d_base_p * (clover * multipliers)[:, None]
+               + (base_p * clover)[:, None] * d_multiplier)
+        d_p[scenarios, clover_offset + k] += base_p * multipliers
+        d_p[raw_p >= 1] = 0
+        p = np.minimum(raw_p, 1)
+
+        # 材料成本 = 各副卡价值之和 + 四叶草价值
+        material = (count * Vcard_mins[:, [i - 1, i - 2, max(i - 3, 0)]]).sum(axis=1) + Vclovers[k]
+        d_material = np.einsum('st,stp->sp', count, d_Vcard[:, [i - 1, i - 2, max(i - 3, 0)]])
+        d_material[scenarios, Vclover_offset + k] += 1
+
+        cost = material / p
+        d_cost = d_material / p[:, None] - (material / p**2)[:, None] * d_p
+        if punishment_factors is not None and i >= 7:
+            factor = punishment_factors[i]
+            d_cost *= factor
+            d_cost[:, factor_offset + i - 1] += cost
+        d_Vcard[:, i] = d_Vcard[:, i-1] + d_cost
+
+    derivatives = d_Vcard.reshape(n_vip, n_guild, star_limit + 1, n_params)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        elasticities = derivatives * values / result["Vcard_mins"][..., None]
+    return {
+        "parameters": names,
+        "values": values,
+        "result": result,
+        "derivatives": derivatives,
+        "elasticities": elasticities
+    }
+
+
+def rank_parameters(sensitivity, star=STAR_LIMIT, top=10):
+    """
+    按所有场景平均弹性绝对值对参数排序
+
+    Args:
+        sensitivity: solve_sensitivity 的返回值
+        star: 目标星级
+        top: 返回前多少个参数
+
+    Returns:
+        [(参数名称, 平均弹性绝对值), ...]
+    """
+    scores = np.abs(sensitivity["elasticities"][:, :, star, :]).mean(axis=(0, 1))
+    order = np.argsort(-scores, kind="stable")[:top]
+    return [(sensitivity["parameters"][n], float(scores[n])) for n in order]
+
+
+def main():
+    import model_with_punishment as model
+
+    sensitivity = solve_sensitivity(
+        model.p_list, model.clover_additions, model.Vclovers,
+        model.VIP_additions, model.guild_additions,
+        punishment_factors=model.load_punishment_factors(),
+        star_limit=model.STAR_LIMIT
+    )
+    print(f"{model.STAR_LIMIT}星卡片价值的主要影响参数（所有场景平均弹性）：")
+    for name, score in rank_parameters(sensitivity, model.STAR_LIMIT):
+        print(f"{name}: {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
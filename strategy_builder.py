@@ -1,40 +1,94 @@
 """
 Author: HPC2H2
 Date: 2025-07-22
-Version: 1.0
+Modified1: 2025-08-14
+Version: 1.1
 Coding: UTF-8
 License: MIT
 Description: strategy_builder.py
 """
 
+CLOVER_LEVELS = ('', '1', '2', '3', '4', '5', '6', 'S', 'SS', 'SSS', 'SSR')
+
+
+def engine_probability(p):
+    """
+    将引擎结果数组中的成功概率转换为原模型的取值
+
+    引擎把超过上限的概率截断为浮点数 1.0，原模型截断时得到整数 1，策略字符串中显示为 "1"
+
+    Args:
+        p: 引擎结果中的成功概率
+
+    Returns:
+        截断到上限时为整数 1，否则为原值
+    """
+    return 1 if p >= 1 else p
+
+
+class StrategyRecord:
+    """紧凑的强化策略记录，只在展示时格式化为文本"""
+    __slots__ = ('cards', 'clover', 'probability', 'expected_cost')
+
+    def __init__(self, cards=(), clover=None, probability=None, expected_cost=None):
+        """
+        Args:
+            cards: 副卡星级元组
+            clover: 四叶草等级下标，None 或 0 表示不使用四叶草
+            probability: 成功概率
+            expected_cost: 期望成本
+        """
+        self.cards = tuple(cards)
+        self.clover = clover
+        self.probability = probability
+        self.expected_cost = expected_cost
+
+    def format(self, clover_levels=CLOVER_LEVELS):
+        """格式化为策略字符串"""
+        strategy = " 使用卡片:" + " ".join(str(card) for card in self.cards)
+        if self.clover:
+            strategy += " 四叶草等级：" + clover_levels[self.clover]
+        if self.probability is not None:
+            strategy += " 成功概率：" + str(self.probability)
+        return strategy
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return (f"StrategyRecord(cards={self.cards}, clover={self.clover}, "
+                f"probability={self.probability}, expected_cost={self.expected_cost})")
+
+
 class StrategyBuilder:
+    __slots__ = ('cards', 'clover', 'probability')
+
     def __init__(self):
         self.cards = []
         self.clover = None
         self.probability = None
-    
+
     def add_card(self, card):
         """添加一张卡片"""
         if card is not None:
-            self.cards.append(str(card))
+            self.cards.append(card)
         return self  # 支持链式调用
-    
+
     def use_clover(self, clover_level):
         """使用四叶草加成"""
         if clover_level: # 字符串非空
-            self.clover = clover_level
+            self.clover = CLOVER_LEVELS.index(clover_level)
         return self
-    
+
     def set_probability(self, p):
         """设置概率"""
         self.probability = p
         return self
-    
+
+    def build_record(self, expected_cost=None):
+        """构建紧凑的策略记录"""
+        return StrategyRecord(self.cards, self.clover, self.probability, expected_cost)
+
     def build(self):
         """构建最终策略字符串"""
-        strategy = " 使用卡片:" + " ".join(self.cards)
-        if self.clover is not None:
-            strategy += " 四叶草等级：" + self.clover
-        if self.probability is not None:
-            strategy += " 成功概率：" + str(self.probability)
-        return strategy
\ No newline at end of file
+        return self.build_record().format()
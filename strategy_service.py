@@ -0,0 +1,322 @@
+"""
+Author: HPC2H2
+Date: 2025-08-16
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 基于预计算结果的低延迟强化策略查询服务。
+             启动时将 最佳策略 / 单张卡片的价值 表载入以 (VIP, 公会, 星级) 为键的内存索引，
+             通过 Python API 或本地 HTTP 接口回答单个及批量查询；
+             未预计算的场景用与载入结果相同的模型按需求解，并按 LRU 缓存。
+"""
+
+import os
+import json
+import argparse
+import importlib
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from enhancement_engine import solve_enhancement, format_strategy, STAR_LIMIT
+from result_store import ResultStore
+from pareto_frontier import ParetoTable
+
+
+# 支持按需求解的模型：结果目录名或结果文件头部记录的模型名称 -> 参数所在的模块
+SOLVER_MODELS = {
+    "model_with_addition": "model_with_addition",
+    "model_with_punishment": "model_with_punishment",
+    "model_with_mdp": "model_with_punishment",
+    "model_with_coupled": "model_with_punishment"
+}
+
+
+def model_solver(model_name):
+    """
+    构造与预计算结果同一模型的按需求解函数，惩罚因子只在构造时载入一次
+
+    Args:
+        model_name: 结果所属的模型，例如 "model_with_punishment"、"model_with_mdp"，见 SOLVER_MODELS
+
+    Returns:
+        solver(vip, guild) -> {星级: 查询结果}；不支持的模型返回 None
+    """
+    if model_name not in SOLVER_MODELS:
+        return None
+    from coupled_solver import solve_coupled
+
+    model = importlib.import_module(SOLVER_MODELS[model_name])
+    kwargs = dict(clover_additions=model.clover_additions, Vclovers=model.Vclovers, star_limit=model.STAR_LIMIT)
+    if model_name in ("model_with_punishment", "model_with_coupled"):
+        punishment_factors = model.load_punishment_factors()
+
+    def solve(vip, guild):
+        if not (0 <= vip < len(model.VIP_additions) and 0 <= guild < len(model.guild_additions)):
+            raise KeyError((vip, guild))
+        multiplier = 1 + model.guild_additions[guild] + model.VIP_additions[vip]
+        if model_name == "model_with_addition":
+            result = solve_enhancement(model.p_list, multiplier=multiplier, **kwargs)
+        elif model_name == "model_with_mdp":
+            result = solve_enhancement(model.p_list, multiplier=multiplier,
+                                       downgrade_levels=model.downgrade_levels, **kwargs)
+        elif model_name == "model_with_coupled":
+            # 以载入的惩罚因子为初值，求解该场景自己的自洽惩罚因子
+            result = solve_coupled(model.p_list, multipliers=multiplier, punishment_factors=punishment_factors,
+                                   downgrade_levels=model.downgrade_levels, verbose=False, **kwargs)[0]
+        else:
+            result = solve_enhancement(model.p_list, multiplier=multiplier,
+                                       punishment_factors=punishment_factors, **kwargs)
+        return {
+            i: {
+                "最佳策略": model.p_list[0][i] + format_strategy(result, i, model.clover_levels),
+                "价值": float(result["Vcard_mins"][i]),
+                "成本": float(result["cost_mins"][i])
+            }
+            for i in range(1, model.STAR_LIMIT + 1)
+        }
+
+    return solve
+
+
+class StrategyIndex:
+    """以 (VIP, 公会, 星级) 为键的内存策略索引"""
+
+    def __init__(self, solver="auto", cache_size=128):
+        """
+        Args:
+            solver: 未预计算场景的按需求解函数 solver(vip, guild) -> {星级: 查询结果}，
+                    None 表示不按需求解，"auto" 表示按载入结果的模型选择，见 model_solver
+            cache_size: 按需求解结果的 LRU 缓存场景数
+        """
+        self.entries = {}
+        self._auto_solver = solver == "auto"
+        self.solver = None if self._auto_solver else solver
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # HTTP 服务在多个线程中查询：_lock 保护 LRU 缓存，_pending 记录正在求解的场景，同一场景只求解一次
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.pareto = None
+        self.model = None
+        self.star_limit = STAR_LIMIT
+
+    def load_json_directory(self, json_dir):
+        """载入按场景保存的 JSON 目录，例如 outputjson/model_with_punishment"""
+        for filename in os.listdir(json_dir):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            vip, guild = data["当前VIP等级"], data["当前公会等级"]
+            for key, values in data["单张卡片的价值"].items():
+                self.entries[(vip, guild, int(key))] = {
+                    "最佳策略": data["最佳策略"][key],
+                    "价值": values["价值"],
+                    "成本": values["成本"]
+                }
+        # 目录名即模型名称，例如 model_with_punishment
+        self._use_model(os.path.basename(os.path.normpath(json_dir)))
+        return self
+
+    def load_store(self, path):
+        """载入 result_store.py 生成的列式二进制结果文件"""
+        store = ResultStore(path)
+        n_vip, n_guild, n_star, _ = store.shape
+        values = store.query(field=["价值", "成本"]).tolist()
+        for vip in range(n_vip):
+            for guild in range(n_guild):
+                for s in range(n_star):
+                    star = s + store.first_star
+                    record = store.strategy_record(vip, guild, star)
+                    self.entries[(vip, guild, star)] = {
+                        "最佳策略": f"{star - 1}→{star}" + record.format(),
+                        "价值": values[vip][guild][s][0],
+                        "成本": values[vip][guild][s][1]
+                    }
+        self._use_model(store.header.get("model", ""))
+        return self
+
+    def _use_model(self, model_name):
+        """按载入结果的模型选择按需求解函数"""
+        if self._auto_solver:
+            self.model = model_name
+            self.solver = model_solver(model_name)
+            if model_name in SOLVER_MODELS:
+                self.star_limit = importlib.import_module(SOLVER_MODELS[model_name]).STAR_LIMIT
+
+    def load_pareto(self, path):
+        """载入 pareto_frontier.py 生成的帕累托前沿文件"""
+        self.pareto = ParetoTable.load(path)
+        return self
+
+    def lookup_pareto(self, vip, guild, star):
+        """
+        查询单个场景单个星级的帕累托前沿（按期望成本升序）
+
+        Raises:
+            KeyError: 未载入前沿文件或场景超出范围
+        """
+        if self.pareto is None:
+            raise KeyError((vip, guild, star))
+        try:
+            return self.pareto.lookup((vip, guild), star)
+        except ValueError:
+            raise KeyError((vip, guild, star)) from None
+
+    def lookup(self, vip, guild, star):
+        """
+        查询单个场景单个星级的最佳策略
+
+        Returns:
+            {"最佳策略": 策略字符串, "价值": 卡片价值, "成本": 强化成本}
+
+        Raises:
+            KeyError: 既未预计算也无法按需求解
+        """
+        key = (vip, guild, star)
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry
+        # 星级超出范围时不必求解整个场景
+        if not 1 <= star <= self.star_limit:
+            raise KeyError(key)
+        return self._solve(vip, guild)[star]
+
+    def lookup_batch(self, keys):
+        """
+        批量查询，keys 为 (vip, guild, star) 的序列，返回结果列表
+
+        Raises:
+            ValueError: 某个键不是三个整数
+            KeyError: 某个键既未预计算也无法按需求解
+        """
+        entries = self.entries
+        keys = list(keys)
+        for key in keys:
+            if not (isinstance(key, tuple) and len(key) == 3 and all(isinstance(v, int) for v in key)):
+                raise ValueError(f"查询键应为 (vip, guild, star) 三个整数: {key!r}")
+        return [entries.get(key) or self.lookup(*key) for key in keys]
+
+    def _solve(self, vip, guild):
+        """按需求解一个场景，结果按 LRU 缓存"""
+        scenario = (vip, guild)
+        while True:
+            with self._lock:
+                if scenario in self._cache:
+                    self._cache.move_to_end(scenario)
+                    return self._cache[scenario]
+                if self.solver is None:
+                    raise KeyError(scenario)
+                pending = self._pending.get(scenario)
+                if pending is None:
+                    pending = self._pending[scenario] = threading.Event()
+                    break
+            # 其他线程正在求解该场景，完成后重新查询缓存
+            pending.wait()
+
+        # 求解在锁外进行，不阻塞其他场景的查询
+        try:
+            solved = self.solver(vip, guild)
+            with self._lock:
+                self._cache[scenario] = solved
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._pending[scenario]
+            pending.set()
+        return solved
+
+
+def make_handler(index):
+    """构造绑定到指定索引的 HTTP 请求处理类"""
+
+    class StrategyHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            """GET /strategy?vip=9&guild=5&star=12 或 /pareto?vip=9&guild=5&star=12"""
+            url = urlparse(self.path)
+            if url.path not in ("/strategy", "/pareto"):
+                self._send_json(404, {"error": "未知路径"})
+                return
+            params = parse_qs(url.query)
+            try:
+                key = tuple(int(params[name][0]) for name in ("vip", "guild", "star"))
+            except (KeyError, ValueError):
+                self._send_json(400, {"error": "需要整数参数 vip、guild、star"})
+                return
+            try:
+                lookup = index.lookup_pareto if url.path == "/pareto" else index.lookup
+                self._send_json(200, lookup(*key))
+            except KeyError:
+                self._send_json(404, {"error": f"没有场景 {key} 的结果"})
+
+        def do_POST(self):
+            """POST /strategy/batch，请求体为 [[vip, guild, star], ...]"""
+            if urlparse(self.path).path != "/strategy/batch":
+                self._send_json(404, {"error": "未知路径"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                keys = [tuple(int(v) for v in key) for key in json.loads(self.rfile.read(length))]
+                results = index.lookup_batch(keys)
+            except (ValueError, TypeError):
+                self._send_json(400, {"error": "请求体应为 [[vip, guild, star], ...]"})
+                return
+            except KeyError as e:
+                self._send_json(404, {"error": f"没有场景 {e.args[0]} 的结果"})
+                return
+            self._send_json(200, results)
+
+        def log_message(self, format, *args):
+            # 高频查询下不逐条打印访问日志
+            pass
+
+    return StrategyHandler
+
+
+def serve(index, host="127.0.0.1", port=8765):
+    """启动本地 HTTP 查询服务"""
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    print(f"策略查询服务已启动：http://{host}:{port}/strategy?vip=9&guild=5&star=12")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于预计算结果的强化策略查询服务")
+    parser.add_argument("--source", default=os.path.join("outputjson", "model_with_punishment"),
+                        help="预计算结果：JSON 目录或 .fvr 列式二进制文件")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pareto", help="帕累托前沿文件（.pareto.npz），提供 /pareto 查询")
+    parser.add_argument("--cache-size", type=int, default=128, help="按需求解结果的 LRU 缓存场景数")
+    args = parser.parse_args()
+
+    index = StrategyIndex(cache_size=args.cache_size)
+    if os.path.isdir(args.source):
+        index.load_json_directory(args.source)
+    else:
+        index.load_store(args.source)
+    if index.solver is None:
+        print(f"不支持按需求解模型 {index.model!r} 的结果，未预计算的场景返回 404")
+    if args.pareto:
+        index.load_pareto(args.pareto)
+    serve(index, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Author: HPC2H2
+Date: 2025-09-02
+Version: 1.0
+Coding: UTF-8
+License: MIT
+Description: 求解过程的结构化跟踪记录。
+             代替在求解循环中逐条 print，按级别（off / star / candidate）写出 NDJSON 记录，
+             先在内存中缓冲、攒够一块再写入文件或管道，可选 gzip 压缩。
+             关闭时调用方只做一次整数比较（if tracer.level >= TRACE_STAR: ...），
+             不产生任何格式化开销。load_trace 读回记录用于分析。
+
+             没有命令行参数的脚本可设置环境变量 FVR_TRACE=PATH（以 .gz 结尾时压缩）
+             与 FVR_TRACE_LEVEL=star|candidate 开启，只在主进程中生效，工作进程重新导入时不会覆盖该文件。
+"""
+
+import os
+import gzip
+import json
+import time
+import atexit
+import multiprocessing
+
+TRACE_OFF = 0
+# 每个星级一条记录：各场景的最佳策略与价值
+TRACE_STAR = 1
+# 每个候选一条记录：各场景该候选的成功概率与期望成本
+TRACE_CANDIDATE = 2
+LEVELS = {"off": TRACE_OFF, "star": TRACE_STAR, "candidate": TRACE_CANDIDATE}
+
+FORMAT_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class Tracer:
+    """缓冲的 NDJSON 跟踪输出"""
+
+    def __init__(self):
+        self.level = TRACE_OFF
+        self.file = None
+        self._owns_file = False
+        self._buffer = []
+        self._buffered = 0
+        self.buffer_size = 1 << 20
+        # capture() 开启后收集的记录，None 表示不收集
+        self._records = None
+
+    def open(self, target, level="star", compress=None, buffer_size=1 << 20):
+        """
+        开始记录
+
+        Args:
+            target: 文件路径，或已打开的文本文件对象（例如管道）
+            level: "star" 或 "candidate"
+            compress: 是否 gzip 压缩，None 表示按路径是否以 .gz 结尾决定；对文件对象无效
+            buffer_size: 缓冲的字符数，攒够后一次写入
+        """
+        self.close()
+        if isinstance(level, str):
+            if level not in LEVELS:
+                raise ValueError(f"未知的跟踪级别: {level}")
+            level = LEVELS[level]
+        if isinstance(target, (str, os.PathLike)):
+            if compress is None:
+                compress = os.fspath(target).endswith(".gz")
+            directory = os.path.dirname(os.fspath(target))
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = (gzip.open(target, "wt", encoding="utf-8") if compress
+                         else open(target, "w", encoding="utf-8"))
+            self._owns_file = True
+        else:
+            self.file = target
+            self._owns_file = False
+        self.buffer_size = buffer_size
+        self.level = level
+        self.emit("trace", version=FORMAT_VERSION,
+                  level=next(name for name, value in LEVELS.items() if value == level),
+                  started=time.time())
+        return self
+
+    def emit(self, event, **fields):
+        """
+        写入一条记录，调用方应先检查 tracer.level，避免关闭时构造记录内容
+
+        Args:
+            event: 记录类型，例如 "star"、"candidate"、"scenario"
+            fields: 可 JSON 序列化的字段（numpy 数组请先 tolist()）
+        """
+        if self._records is not None:
+            self._records.append({"event": event, **fields})
+            return
+        if self.file is None:
+            return
+        line = json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n"
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """写出缓冲的记录"""
+        if self._buffer and self.file is not None:
+            self.file.write("".join(self._buffer))
+            self.file.flush()
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """写出剩余记录并关闭自己打开的文件"""
+        if self.file is not None:
+            self.flush()
+            if self._owns_file:
+                self.file.close()
+        self.file = None
+        self.level = TRACE_OFF
+
+    def discard(self):
+        """
+        放弃当前输出而不写入或关闭文件
+
+        fork 出的工作进程继承了父进程的文件与缓冲，需在进程初始化时调用，避免重复写入
+        """
+        self.file = None
+        self._buffer = []
+        self._buffered = 0
+        self._records = None
+        self.level = TRACE_OFF
+
+    def capture(self, level):
+        """
+        在内存中收集记录而不写入文件，用于工作进程把记录交回主进程写出
+
+        Args:
+            level: 跟踪级别（整数或 "star" / "candidate"）
+        """
+        self.discard()
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        if self.level > TRACE_OFF:
+            self._records = []
+        return self
+
+    def collect(self):
+        """
+        取出 capture() 以来收集的记录
+
+        Returns:
+            记录字典的列表，每条含 event 字段；未开启收集时为空列表
+        """
+        records = self._records or []
+        if self._records is not None:
+            self._records = []
+        return records
+
+
+def load_trace(path, event=None):
+    """
+    读回跟踪记录，自动识别 gzip 压缩
+
+    Args:
+        path: 跟踪文件路径
+        event: 只返回该类型的记录，None 表示全部
+
+    Returns:
+        记录字典的列表
+    """
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    opener = gzip.open if compressed else open
+    records = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if event is None or record["event"] == event:
+                    records.append(record)
+    return records
+
+
+# 全局跟踪实例，各模块共用
+tracer = Tracer()
+atexit.register(tracer.close)
+
+# spawn 方式启动的工作进程会重新导入本模块，只在主进程中打开环境变量指定的文件
+if os.environ.get("FVR_TRACE") and multiprocessing.parent_process() is None:
+    tracer.open(os.environ["FVR_TRACE"], os.environ.get("FVR_TRACE_LEVEL", "star"))